@@ -0,0 +1,21 @@
+'''Timing and peak memory of the lexicon sentiment score.'''
+
+from benchmarks import common
+from iprt import sentiment
+
+
+class NegPosInv(object):
+    params = [common.SIZES]
+    param_names = ['responses']
+    timeout = 3600
+
+    def setup(self, n):
+        self.df = common.survey(n)
+        self.lexicon_dir = common.lexicon_dir()
+        sentiment.lexicons(self.lexicon_dir)
+
+    def time_neg_pos_inv(self, n):
+        sentiment.neg_pos_inv(self.df, 'thoughts_facs', self.lexicon_dir)
+
+    def peakmem_neg_pos_inv(self, n):
+        sentiment.neg_pos_inv(self.df, 'thoughts_facs', self.lexicon_dir)
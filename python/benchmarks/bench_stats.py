@@ -0,0 +1,34 @@
+'''Timing and peak memory of the bootstrap intervals and the children breakdown scan.'''
+
+from benchmarks import common
+from iprt import bootstrap, breakdown
+
+
+class ChildrenCis(object):
+    params = [common.SIZES]
+    param_names = ['responses']
+    timeout = 3600
+
+    def setup(self, n):
+        self.df = common.survey(n)
+        bootstrap.add_children_12_18(self.df)
+
+    def time_children_cis(self, n):
+        bootstrap.children_cis(self.df, n_samples=1000)
+
+    def peakmem_children_cis(self, n):
+        bootstrap.children_cis(self.df, n_samples=1000)
+
+
+class BreakdownScan(object):
+    params = [common.SIZES]
+    param_names = ['responses']
+
+    def setup(self, n):
+        self.df = breakdown.add_child_groups(common.survey(n))
+
+    def time_scan(self, n):
+        breakdown.scan(self.df)
+
+    def peakmem_scan(self, n):
+        breakdown.scan(self.df)
@@ -0,0 +1,39 @@
+'''Timing and peak memory of the NLTK helpers on synthetic responses.'''
+
+from benchmarks import common
+from iprt import text
+
+
+class MakeTknText(object):
+    params = [common.SIZES]
+    param_names = ['responses']
+    timeout = 3600
+
+    def setup(self, n):
+        self.df = common.survey(n)
+        text.make_tkn_text(self.df.head(100), 'thoughts_facs')  # load nltk and the spell checker
+
+    def time_make_tkn_text(self, n):
+        text.make_tkn_text(self.df, 'thoughts_facs')
+
+    def peakmem_make_tkn_text(self, n):
+        text.make_tkn_text(self.df, 'thoughts_facs')
+
+
+class FieldBigrams(object):
+    params = [common.SIZES]
+    param_names = ['responses']
+    timeout = 3600
+
+    def setup(self, n):
+        self.df = common.survey(n)
+        self.tokens = text.make_tkn_text(self.df, 'thoughts_facs')
+
+    def time_field_bigrams(self, n):
+        text.Field_bigrams(self.df, 'thoughts_facs', 3, 10)
+
+    def time_bigrams_from_tokens(self, n):
+        text.bigrams_from_tokens(self.tokens, 3, 10)
+
+    def peakmem_field_bigrams(self, n):
+        text.Field_bigrams(self.df, 'thoughts_facs', 3, 10)
@@ -0,0 +1,28 @@
+'''
+Synthetic surveys for the benchmarks (iprt.synthetic), so they run without
+the survey files, with the same rows on every run.
+'''
+
+import os
+import tempfile
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+
+def survey(n, seed=0):
+    '''a Midlands layout survey of n respondents with the thoughts_facs column'''
+    from iprt import survey as loader, synthetic
+    return loader.add_thoughts_facs(synthetic.midlands(n, seed=seed))
+
+
+def lexicon_dir():
+    '''a folder with small negative-words.txt and positive-words.txt lexicons'''
+    from iprt.sentiment import LEXICON_HEADER_LINES
+
+    path = tempfile.mkdtemp(prefix='iprt_lexicon_')
+    header = ';\n' * LEXICON_HEADER_LINES
+    with open(os.path.join(path, 'negative-words.txt'), 'w') as f:
+        f.write(header + '\n'.join(['bad', 'dirty', 'cold', 'long', 'wait', 'rude', 'unfair', 'closed']) + '\n')
+    with open(os.path.join(path, 'positive-words.txt'), 'w') as f:
+        f.write(header + '\n'.join(['good', 'clean', 'better', 'help', 'nice', 'friendly', 'fair', 'open']) + '\n')
+    return path
@@ -0,0 +1,10 @@
+'''
+Analysis code for the IPRT prison surveys, packaged up from the notebooks in
+NLTK_code and the scripts in this folder.
+
+Submodules are imported on demand: ``import iprt`` and the ``iprt`` command
+line do not load pandas, nltk, wordcloud or matplotlib until a subcommand
+actually needs them.
+'''
+
+__version__ = '0.1.0'
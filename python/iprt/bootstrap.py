@@ -0,0 +1,65 @@
+'''
+Extrapolating from the Midlands survey to the number of children with a
+parent in any Irish prison (python/bootstrap.py as functions).
+'''
+
+from iprt import instrument
+
+TOTAL_NUM_PRISONERS = 3674  # http://www.iprt.ie/prison-facts-2
+SURVEY_POPULATION = 383
+
+# column -> description used in the printed results
+CHILD_COLUMNS = [
+    ('children_number', 'children'),
+    ('children_aged_under_5', 'children under 5'),
+    ('children_aged_5_12', 'children between 5 and 12'),
+    ('children_aged_12_18', 'children between 12 and 18'),
+    ('adult_children', 'adult children'),
+]
+
+
+def add_children_12_18(df):
+    df['children_aged_12_18'] = (df['boys_under_18'].values + df['girls_under_18'].values
+                                 - df['children_aged_5_12'].values - df['children_aged_under_5'].values)
+    return df
+
+
+@instrument.instrumented('bootstrap')
+def children_cis(df, n_samples=10000, alpha=0.05):
+    '''
+    total and bootstrapped confidence interval of the total for every child
+    column, as a DataFrame indexed by column name
+    '''
+    import numpy as np
+    import pandas as pd
+    from scikits import bootstrap
+
+    if 'children_aged_12_18' not in df.columns:
+        add_children_12_18(df)
+    rows = []
+    for col, label in CHILD_COLUMNS:
+        low, high = bootstrap.ci(data=df[col], statfunction=np.sum, n_samples=n_samples, alpha=alpha)
+        rows.append({'column': col, 'label': label, 'total': np.sum(df[col]), 'ci_low': low, 'ci_high': high})
+    return pd.DataFrame(rows).set_index('column')
+
+
+def extrapolate(cis, total_num_prisoners=TOTAL_NUM_PRISONERS, survey_population=SURVEY_POPULATION):
+    '''scale the survey confidence intervals up to the whole prison population'''
+    import numpy as np
+
+    scale = total_num_prisoners / survey_population
+    out = cis.copy()
+    out['ci_low'] = np.ceil(cis['ci_low'] * scale).astype(int)
+    out['ci_high'] = np.ceil(cis['ci_high'] * scale).astype(int)
+    return out
+
+
+def print_cis(cis, irish, total_num_prisoners=TOTAL_NUM_PRISONERS, survey_population=SURVEY_POPULATION):
+    for _, row in cis.iterrows():
+        print('Number of ' + row['label'] + ' with parent in Midlands Prison: '
+              + str(row['ci_low']) + ' to ' + str(row['ci_high']))
+    print('Assuming a total Irish prison population of ' + str(total_num_prisoners)
+          + ' and a survey sample of ' + str(survey_population) + ':')
+    for _, row in irish.iterrows():
+        print('Number of ' + row['label'] + ' with parent in an Irish Prison: '
+              + str(row['ci_low']) + ' to ' + str(row['ci_high']))
@@ -0,0 +1,62 @@
+'''
+Searches for significant differences in attitudes between prisoners with a
+child in a given age group and all other prisoners (python/children_breakdown.py
+as functions).
+'''
+
+from iprt import instrument
+
+CHILD_GROUPS = ['cu5', 'c5_12', 'c12_18', 'cadult']
+
+
+def add_child_groups(df):
+    import numpy as np
+
+    df['cu5'] = np.where(df['children_aged_under_5'] > 0, True, False)
+    df['c5_12'] = np.where(df['children_aged_5_12'] > 0, True, False)
+    df['cadult'] = np.where(df['adult_children'] > 0, True, False)
+    df['c12_18'] = np.where((df['boys_under_18'] + df['girls_under_18']
+                             - df['children_aged_5_12'] - df['children_aged_under_5']) > 0, True, False)
+    return df
+
+
+def prison_service_columns(df):
+    # the long column names are the prison service questions
+    return [col for col in df.columns if len(str(col)) > 40]
+
+
+@instrument.instrumented('ttest')
+def scan(df, alpha=0.05, cols=None):
+    '''
+    t-test every prison service column between each child group and the rest
+    returns a DataFrame of the significant (childgroup, column) pairs
+    '''
+    import numpy as np
+    import pandas as pd
+    from scipy.stats import ttest_ind
+
+    if 'cu5' not in df.columns:
+        add_child_groups(df)
+    if cols is None:
+        cols = prison_service_columns(df)
+    values = df[cols].values.astype(float)
+    rows = []
+    for childgroup in CHILD_GROUPS:
+        mask = df[childgroup].values.astype(bool)
+        # one call tests every column at once
+        tstat, pval = ttest_ind(values[mask], values[~mask], axis=0)
+        for i in np.flatnonzero(pval < alpha):
+            mean_true = np.mean(values[mask, i])
+            mean_false = np.mean(values[~mask, i])
+            rows.append({
+                'childgroup': childgroup,
+                'column': cols[i],
+                'tstat': tstat[i],
+                'pval': pval[i],
+                'mean_in_group': mean_true,
+                'mean_rest': mean_false,
+                # percentage less satisfied than the others
+                'pct_difference': 100.0 * (mean_false - mean_true) / mean_true,
+            })
+    return pd.DataFrame(rows, columns=['childgroup', 'column', 'tstat', 'pval',
+                                       'mean_in_group', 'mean_rest', 'pct_difference'])
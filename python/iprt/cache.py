@@ -0,0 +1,45 @@
+'''
+Hashing helpers for content addressed caching.
+
+Everything is reduced to a sha256 hex digest: files by their bytes, data
+frames with pandas' own row hashing, and parameters by their sorted JSON.
+'''
+
+import hashlib
+import json
+import pickle
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_frame(df):
+    '''hash of a DataFrame's values, index and column names'''
+    import pandas as pd
+
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    h.update(json.dumps([str(c) for c in df.columns]).encode('utf-8'))
+    return h.hexdigest()
+
+
+def hash_params(params):
+    return hash_bytes(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+
+
+def hash_object(obj):
+    '''hash of an arbitrary picklable object'''
+    return hash_bytes(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def combine(*digests):
+    return hash_bytes('|'.join(digests).encode('utf-8'))
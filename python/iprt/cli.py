@@ -0,0 +1,419 @@
+'''
+The ``iprt`` command line.
+
+    iprt text-stats survey.xlsx --group-by Age --bigrams
+    iprt text-stats synthetic_mid_lim_wht.csv --check
+    iprt bootstrap survey_results_clean.csv.xlsx
+    iprt breakdown survey_results_clean.csv.xlsx
+    iprt pipeline MID_LIM_WHT_Data.xlsx --filter-freq 5
+    iprt partitions 'waves/*.csv' --group-by Age
+    iprt export survey_results_clean.csv --output results
+    iprt missing survey_results_clean.csv
+    iprt spell-index --check survey_results_clean.csv
+    iprt synthetic synthetic_midlands.csv --rows 100000
+    iprt cold-start
+    iprt --report run.json pipeline MID_LIM_WHT_Data.xlsx
+    iprt --profile results/profile.json pipeline MID_LIM_WHT_Data.xlsx
+
+Only argparse and the standard library are imported at start up. Each
+subcommand imports pandas/nltk/scipy inside its own function, so printing
+help or running a cheap command does not pay for the heavy imports.
+'''
+
+import argparse
+import sys
+
+
+def run_text_stats(args):
+    from collections import Counter
+    from iprt import survey, text
+
+    if args.spell_index:
+        from iprt import spelling
+        text.set_spell_checker(spelling.SpellIndex.load(args.spell_index))
+    df = survey.load_survey(args.path)
+    if args.check is not None:
+        from iprt import parallel
+        schema = survey.detect_schema(df) or survey.MIDLANDS
+        group_cols = [args.group_by] if args.group_by else [c for c in schema['groupings'] if c in df.columns]
+        sizes = args.check or [1, 7, 50, 500]
+        differences = parallel.check(df, args.column, group_cols, sizes, args.shard_by, args.filter_freq, args.top)
+        for size, table, col, group in differences:
+            print('rows per shard ' + str(size) + ': ' + table + ' ' + str(col) + ' = ' + str(group) + ' differs')
+        if differences:
+            sys.exit('the sharded tables differ from text.grouped_ngrams')
+        print('the sharded tables match text.grouped_ngrams for ' + ', '.join(map(str, sizes)) + ' rows per shard')
+        return
+    if args.group_by is not None and (args.processes is not None or args.result_cache is not None):
+        compute = text.grouped_ngrams
+        if args.processes is not None:
+            import functools
+            from iprt import parallel
+            compute = functools.partial(parallel.parallel_grouped_ngrams, shard_by=args.shard_by,
+                                        processes=args.processes)
+        if args.result_cache is not None:
+            from iprt import resultcache
+            tables = resultcache.cached_grouped_ngrams(df, args.column, [args.group_by], args.filter_freq, args.top,
+                                                       result_cache=resultcache.ResultCache(args.result_cache),
+                                                       compute=compute)
+        else:
+            tables = compute(df, args.column, [args.group_by], args.filter_freq, args.top)
+        for idx, common in tables[0][args.group_by].items():
+            print(str(args.group_by) + ' = ' + str(idx))
+            print('Most common words:', common)
+            if args.bigrams:
+                print('Bigrams:', tables[1][args.group_by][idx])
+            if args.trigrams:
+                print('Trigrams:', tables[2][args.group_by][idx])
+        return
+    groups = [(None, df)] if args.group_by is None else list(df.groupby(args.group_by))
+    for idx, grp in groups:
+        if idx is not None:
+            print(str(args.group_by) + ' = ' + str(idx))
+        tokens = text.make_tkn_text(grp, args.column)
+        print('Most common words:', Counter(tokens).most_common(args.top))
+        if args.bigrams:
+            print('Bigrams:', text.bigrams_from_tokens(tokens, args.filter_freq, args.top))
+        if args.trigrams:
+            print('Trigrams:', text.trigrams_from_tokens(tokens, args.filter_freq, args.top))
+
+
+def run_bootstrap(args):
+    from iprt import bootstrap, survey
+
+    df = survey.load_survey(args.path)
+    cis = bootstrap.children_cis(df, n_samples=args.n_samples)
+    irish = bootstrap.extrapolate(cis, args.prisoners, args.sample)
+    bootstrap.print_cis(cis, irish, args.prisoners, args.sample)
+
+
+def run_breakdown(args):
+    from iprt import breakdown, survey
+
+    df = survey.load_survey(args.path)
+    results = breakdown.scan(df, alpha=args.alpha)
+    if len(results) == 0:
+        print('No significant differences at p < ' + str(args.alpha))
+    for _, row in results.iterrows():
+        print(row['childgroup'] + ' / ' + str(row['column']))
+        print('Pvalue = ' + str(row['pval']))
+        print('Tstat = ' + str(row['tstat']))
+        print('Percentage less satisfied than other: ' + str(row['pct_difference']))
+
+
+def run_pipeline(args):
+    from iprt import pipeline
+
+    pipe = pipeline.analysis_pipeline(args.path, cache_dir=args.cache_dir, column=args.column,
+                                      group_cols=args.group_by, filter_freq=args.filter_freq,
+                                      no2return=args.top, lexicon_dir=args.lexicon_dir,
+                                      wordcloud_dir=args.wordcloud_dir, mask_path=args.mask,
+                                      processes=args.processes, dedup=args.dedup, topics=args.topics,
+                                      topic_method=args.topic_method)
+    outputs = pipe.run(args.targets)
+    if args.export:
+        from iprt import export
+        frames = export.pipeline_frames(outputs)
+        for fn in export.write_parquet(frames, args.export):
+            print('saved ' + fn)
+    for name, status in pipe.status.items():
+        print(name + ': ' + status)
+    for fn in outputs.get('wordclouds', []):
+        print('saved ' + fn)
+    for (table, col), frame in sorted(outputs.get('tables', {}).items()):
+        print(table + ' by ' + str(col))
+        print(frame)
+    if 'topics' in outputs:
+        print('top terms of each topic')
+        print(outputs['topics']['top_terms'])
+        for col, frame in outputs['topics']['topic_prevalence'].items():
+            print('topic prevalence by ' + str(col))
+            print(frame)
+
+
+def run_partitions(args):
+    from iprt import mapreduce
+
+    paths = mapreduce.partition_paths(args.pattern)
+    if not paths:
+        sys.exit('no files match ' + args.pattern)
+    state = mapreduce.count_partitions(paths, args.column, args.group_by, scheduler=args.scheduler,
+                                       processes=args.processes, address=args.address)
+    print_tables(mapreduce.ngram_tables(state, args.group_by or [None], args.filter_freq, args.top))
+
+
+def print_tables(tables):
+    for name, table in zip(['common_words', 'bigrams_phrases', 'trigrams_phrases'], tables):
+        for col, by_group in table.items():
+            for group, rows in by_group.items():
+                print(name + ' ' + str(col) + ' = ' + str(group) + ': ' + str(rows))
+
+
+def run_tokens(args):
+    import time
+    from iprt import survey, tokens
+
+    df = survey.load_survey(args.path)
+    start = time.time()
+    # with --approx the exact n-gram matrices are not built, to keep to the memory budget
+    store = tokens.cached_store(df, args.column, cache_dir=args.cache_dir,
+                               ngram_sizes=() if args.approx else (1, 2, 3))
+    print(store.path + ': ' + str(len(store)) + ' responses, ' + str(len(store.ids)) + ' tokens, '
+          + str(len(store.vocab)) + ' words (' + '%.2f s' % (time.time() - start) + ')')
+    if args.approx:
+        from iprt import sketch
+        for col in args.group_by or [None]:
+            labels = None if col is None else df.loc[store.doc_index, col].values
+            for n, name in [(1, 'words'), (2, 'bigrams'), (3, 'trigrams')]:
+                tops = sketch.approx_top_ngrams(store, labels, n=n, k=args.top,
+                                                memory_bytes=int(args.memory * 2 ** 20))
+                for group, (rows, distinct) in sorted(tops.items(), key=lambda kv: str(kv[0])):
+                    print(name + ' ' + str(col) + ' = ' + str(group) + ' (~' + str(int(distinct)) + ' distinct): '
+                          + str([(ngram, count) for ngram, count, _ in rows]))
+    elif args.group_by is not None:
+        from iprt import mapreduce
+        # the workers memory map the store rather than being sent the tokens
+        state = mapreduce.count_store(store, df.loc[store.doc_index, args.group_by], processes=args.processes)
+        print_tables(mapreduce.ngram_tables(state, args.group_by or [None], args.filter_freq, args.top))
+
+
+def run_synthetic(args):
+    from iprt import synthetic
+
+    make = synthetic.midlands if args.schema == 'midlands' else synthetic.mid_lim_wht
+    print('saved ' + synthetic.write(make(args.rows, seed=args.seed), args.output))
+
+
+def run_export(args):
+    import os
+    from iprt import export, survey
+
+    df = survey.load_survey(args.path)
+    schema = survey.detect_schema(df) or survey.MIDLANDS
+    group_cols = args.group_by or [col for col in schema['groupings'] if col in df.columns]
+    frames = {'ngrams': export.scored_ngrams(df, args.column, group_cols, args.filter_freq, args.top)}
+    if all(os.path.exists(os.path.join(args.lexicon_dir, fn)) for fn in ['negative-words.txt', 'positive-words.txt']):
+        from iprt import sentiment
+        scores = sentiment.response_scores(df, schema['thoughts'], args.lexicon_dir)
+        frames['sentiment'] = export.sentiment_frame(scores, df, group_cols)
+    if schema is survey.MIDLANDS and 'children_aged_5_12' in df.columns:
+        from iprt import bootstrap, breakdown
+        cis = bootstrap.children_cis(df, n_samples=args.n_samples)
+        frames['children_cis'] = export.ci_frame(cis, bootstrap.extrapolate(cis))
+        frames['breakdown'] = export.scan_frame(breakdown.scan(df))
+    for fn in export.write_parquet(frames, args.output):
+        print('saved ' + fn)
+
+
+def run_missing(args):
+    from iprt import missingness, survey
+
+    df = survey.load_survey(args.path)
+    table = missingness.profile(df, text_cols=args.columns, dims=args.by)
+    if args.output:
+        table.to_csv(args.output, index=False)
+    else:
+        print(table.to_string(index=False))
+
+
+def run_spell_index(args):
+    import time
+    from iprt import spelling
+
+    start = time.time()
+    index = spelling.SpellIndex.build(spelling.autocorrect_frequencies(), max_distance=args.max_distance)
+    index.save(args.output)
+    print('built ' + args.output + ' (' + str(len(index.words)) + ' words) in ' + '%.1f s' % (time.time() - start))
+    start = time.time()
+    index = spelling.SpellIndex.load(args.output)
+    print('loaded in ' + '%.1f ms' % (1000 * (time.time() - start)))
+    if args.check:
+        from nltk.tokenize import wordpunct_tokenize
+        from iprt import survey, text
+
+        df = survey.load_survey(args.check)
+        stem = text.stemmer().stem
+        stop = text.stop_words()
+        words = [stem(w.lower()) for t in df[args.column].dropna()
+                 for w in wordpunct_tokenize(t) if w.lower() not in stop]
+        agreement, differences = spelling.compare_with_autocorrect(words, index)
+        print('agrees with autocorrect on ' + '%.2f%%' % (100 * agreement) + ' of the distinct words')
+        if len(differences):
+            print(differences.to_string(index=False))
+
+
+def run_profile_compare(args):
+    from iprt import profiling
+
+    print('%-50s %10s %10s' % ('function', 'old s', 'new s'))
+    for name, old, new in profiling.compare(args.old, args.new, top=args.top):
+        print('%-50s %10.3f %10.3f' % (name[-50:], old, new))
+
+
+def run_cold_start(args):
+    from iprt import coldstart
+
+    record = coldstart.measure(runs=args.runs)
+    previous = coldstart.last_record(args.history)
+    coldstart.append_record(args.history, record)
+    print('iprt --help: ' + '%.1f ms' % record['help_ms'] + ' (median of ' + str(args.runs) + ')')
+    print('import iprt.cli: ' + '%.1f ms' % record['import_ms'])
+    if previous is not None:
+        print('previous: ' + '%.1f ms' % previous['help_ms'] + ' on ' + previous['timestamp'])
+    if record['heavy_imports']:
+        print('WARNING: heavy modules imported at start up: ' + ', '.join(record['heavy_imports']))
+        sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='iprt', description='IPRT survey analysis')
+    parser.add_argument('--report', default=None,
+                        help='time each stage of the command and write a JSON report (and a .folded flamegraph file)')
+    parser.add_argument('--profile', default=None,
+                        help='profile the command and save the profile to this JSON file, e.g. next to the results')
+    parser.add_argument('--profile-mode', choices=['sampling', 'cprofile'], default='sampling')
+    sub = parser.add_subparsers(dest='command')
+
+    p = sub.add_parser('text-stats', help='most common words, bigrams and trigrams of a free text column')
+    p.add_argument('path', help='survey .csv or .xlsx file')
+    p.add_argument('--column', default='thoughts_facs')
+    p.add_argument('--group-by', default=None, help='column to break the results out by')
+    p.add_argument('--top', type=int, default=10, help='number of results to return')
+    p.add_argument('--filter-freq', type=int, default=3, help='ignore n-grams seen fewer times than this')
+    p.add_argument('--bigrams', action='store_true')
+    p.add_argument('--trigrams', action='store_true')
+    p.add_argument('--spell-index', default=None, help='correct spelling with this index instead of autocorrect')
+    p.add_argument('--processes', type=int, default=None, help='count the groups shard by shard in this many processes')
+    p.add_argument('--shard-by', default=None, help='column to shard on with --processes, e.g. the prison')
+    p.add_argument('--result-cache', default=None, help='keep the grouped tables in this folder and reuse them')
+    p.add_argument('--check', type=int, nargs='*', default=None, metavar='ROWS',
+                   help='check the sharded tables equal the serial ones, for these shard sizes (default 1 7 50 500)')
+    p.set_defaults(func=run_text_stats)
+
+    p = sub.add_parser('bootstrap', help='extrapolate the number of children with a parent in prison')
+    p.add_argument('path', help='Midlands survey file')
+    p.add_argument('--prisoners', type=int, default=3674, help='total Irish prison population')
+    p.add_argument('--sample', type=int, default=383, help='number of prisoners surveyed')
+    p.add_argument('--n-samples', type=int, default=10000, help='bootstrap resamples')
+    p.set_defaults(func=run_bootstrap)
+
+    p = sub.add_parser('breakdown', help='t-test prison service answers by age of children')
+    p.add_argument('path', help='Midlands survey file')
+    p.add_argument('--alpha', type=float, default=0.05)
+    p.set_defaults(func=run_breakdown)
+
+    p = sub.add_parser('pipeline', help='run the text analysis stages, reusing cached results')
+    p.add_argument('path', help='survey .csv or .xlsx file')
+    p.add_argument('--column', default='thoughts_facs')
+    p.add_argument('--group-by', nargs='+', default=None, help='columns to break the results out by')
+    p.add_argument('--top', type=int, default=10, help='number of results to return')
+    p.add_argument('--filter-freq', type=int, default=3, help='ignore n-grams seen fewer times than this')
+    p.add_argument('--lexicon-dir', default='.', help='folder with negative-words.txt and positive-words.txt')
+    p.add_argument('--wordcloud-dir', default=None, help='draw the word clouds into this folder')
+    p.add_argument('--mask', default=None, help='image to shape the masked word clouds, e.g. children_bw.jpg')
+    p.add_argument('--processes', type=int, default=None, help='worker processes for drawing, default one per cpu')
+    p.add_argument('--dedup', action='store_true', help='count near duplicate responses once')
+    p.add_argument('--topics', type=int, default=0, help='also fit this many topics (needs scikit-learn)')
+    p.add_argument('--topic-method', choices=['lda', 'nmf'], default='lda')
+    p.add_argument('--cache-dir', default='.iprt_cache')
+    p.add_argument('--targets', nargs='+', default=None, help='stages to run, default all')
+    p.add_argument('--export', default=None,
+                   help='also write the n-grams, sentiment and topics as Parquet to this folder')
+    p.set_defaults(func=run_pipeline)
+
+    p = sub.add_parser('partitions', help='count n-grams over many survey files and merge the counts')
+    p.add_argument('pattern', help="glob of survey files, e.g. 'waves/*.csv'")
+    p.add_argument('--column', default='thoughts_facs')
+    p.add_argument('--group-by', nargs='+', default=[], help='columns to break the results out by')
+    p.add_argument('--top', type=int, default=10, help='number of results to return')
+    p.add_argument('--filter-freq', type=int, default=3, help='ignore n-grams seen fewer times than this')
+    p.add_argument('--scheduler', choices=['serial', 'processes', 'dask'], default='processes')
+    p.add_argument('--processes', type=int, default=None, help='worker processes, default one per cpu')
+    p.add_argument('--address', default=None, help='dask scheduler address, default a new local cluster')
+    p.set_defaults(func=run_partitions)
+
+    p = sub.add_parser('tokens', help='tokenize a free text column once into a memory mapped store')
+    p.add_argument('path', help='survey .csv or .xlsx file')
+    p.add_argument('--column', default='thoughts_facs')
+    p.add_argument('--cache-dir', default='.iprt_cache/tokens')
+    p.add_argument('--group-by', nargs='*', default=None,
+                   help='also count the n-grams from the store, broken out by these columns (none for overall)')
+    p.add_argument('--top', type=int, default=10, help='number of results to return')
+    p.add_argument('--filter-freq', type=int, default=3, help='ignore n-grams seen fewer times than this')
+    p.add_argument('--processes', type=int, default=None, help='worker processes, default one per cpu')
+    p.add_argument('--approx', action='store_true',
+                   help='count the most common n-grams approximately, in fixed memory per group')
+    p.add_argument('--memory', type=float, default=4, help='memory for each group with --approx, in MB')
+    p.set_defaults(func=run_tokens)
+
+    p = sub.add_parser('export', help='write the n-grams, sentiment, intervals and t-tests as Parquet tables')
+    p.add_argument('path', help='survey .csv or .xlsx file')
+    p.add_argument('--output', default='results', help='folder for the .parquet files')
+    p.add_argument('--column', default='thoughts_facs')
+    p.add_argument('--group-by', nargs='+', default=None, help='columns to break the results out by')
+    p.add_argument('--top', type=int, default=10, help='number of results to return')
+    p.add_argument('--filter-freq', type=int, default=3, help='ignore n-grams seen fewer times than this')
+    p.add_argument('--lexicon-dir', default='.', help='folder with negative-words.txt and positive-words.txt')
+    p.add_argument('--n-samples', type=int, default=10000, help='bootstrap resamples')
+    p.set_defaults(func=run_export)
+
+    p = sub.add_parser('missing', help='empty free text responses by group')
+    p.add_argument('path', help='survey .csv or .xlsx file')
+    p.add_argument('--columns', nargs='+', default=None, help='text columns, default the free text fields')
+    p.add_argument('--by', nargs='+', default=None, help='dimensions, default age, sentence length, ...')
+    p.add_argument('--output', default=None, help='write the table to this csv file')
+    p.set_defaults(func=run_missing)
+
+    p = sub.add_parser('spell-index', help='build the spelling index from the autocorrect dictionary')
+    p.add_argument('--output', default='spell_index.npz')
+    p.add_argument('--max-distance', type=int, default=2)
+    p.add_argument('--check', default=None, help='survey file whose words are checked against autocorrect')
+    p.add_argument('--column', default='thoughts_facs')
+    p.set_defaults(func=run_spell_index)
+
+    p = sub.add_parser('synthetic', help='write a synthetic survey in the layout of the real files')
+    p.add_argument('output', help='.csv or .xlsx file to write')
+    p.add_argument('--schema', choices=['midlands', 'mid_lim_wht'], default='midlands')
+    p.add_argument('--rows', type=int, default=10000)
+    p.add_argument('--seed', type=int, default=0)
+    p.set_defaults(func=run_synthetic)
+
+    p = sub.add_parser('profile-compare', help='the functions whose time changed most between two --profile files')
+    p.add_argument('old')
+    p.add_argument('new')
+    p.add_argument('--top', type=int, default=20)
+    p.set_defaults(func=run_profile_compare)
+
+    p = sub.add_parser('cold-start', help='time the cli start up and record it')
+    p.add_argument('--runs', type=int, default=5)
+    p.add_argument('--history', default='cold_start.jsonl', help='file the timings are appended to')
+    p.set_defaults(func=run_cold_start)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return
+    if args.report is None and args.profile is None:
+        args.func(args)
+        return
+    import contextlib
+    from iprt import instrument, profiling
+
+    with contextlib.ExitStack() as stack:
+        recorder = stack.enter_context(instrument.Recorder()) if args.report else None
+        prof = stack.enter_context(profiling.profiler(args.profile_mode)) if args.profile else None
+        with instrument.stage(args.command):
+            args.func(args)
+    if recorder is not None:
+        recorder.write(args.report)
+        print(recorder.summary())
+        print('saved ' + args.report)
+    if prof is not None:
+        prof.save(args.profile)
+        print(profiling.summary(prof.report()))
+        print('saved ' + args.profile)
@@ -0,0 +1,64 @@
+'''
+Measuring how long the cli takes to start, so that a heavy import creeping
+back in to module level shows up. Each measurement is appended as a line of
+JSON to a history file (cold_start.jsonl by default).
+'''
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from iprt import __version__
+
+# modules that must not be imported just by starting the cli
+HEAVY_MODULES = ['pandas', 'numpy', 'scipy', 'nltk', 'matplotlib', 'seaborn',
+                 'wordcloud', 'PIL', 'autocorrect', 'sklearn']
+
+_CHECK_IMPORTS = ('import sys, iprt.cli; '
+                  'print(",".join(m for m in {!r} if m in sys.modules))').format(HEAVY_MODULES)
+
+
+def _time_command(cmd, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+        times.append(1000.0 * (time.perf_counter() - start))
+    return statistics.median(times)
+
+
+def measure(runs=5):
+    '''median wall time of fresh interpreters running the cli, in ms'''
+    help_ms = _time_command([sys.executable, '-m', 'iprt', '--help'], runs)
+    import_ms = _time_command([sys.executable, '-c', 'import iprt.cli'], runs)
+    baseline_ms = _time_command([sys.executable, '-c', 'pass'], runs)
+    out = subprocess.run([sys.executable, '-c', _CHECK_IMPORTS], stdout=subprocess.PIPE,
+                         check=True, universal_newlines=True).stdout.strip()
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'version': __version__,
+        'python': platform.python_version(),
+        'runs': runs,
+        'help_ms': help_ms,
+        'import_ms': import_ms,
+        'interpreter_ms': baseline_ms,
+        'heavy_imports': [m for m in out.split(',') if m],
+    }
+
+
+def last_record(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def append_record(path, record):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
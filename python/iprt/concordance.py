@@ -0,0 +1,165 @@
+'''
+Keyword in context for the free text responses (the commented out
+noK_improve_txt.concordance('fail') calls in Text_as_fn_of_children.py).
+
+A positional inverted index is built once over every response of the given
+text columns: for every normalised term (lower case, stemmed) the responses
+it appears in and its positions there, as sorted numpy arrays. Keyword,
+phrase and proximity queries are lookups and array intersections on those
+postings, optionally restricted to groups (Age, Children, prison, ...), and
+never rescan the text.
+
+    index = ConcordanceIndex.from_frame(df, ['Other_thoughts', 'Suggestions_for_improvement'],
+                                        group_cols=['Age', 'Children'])
+    index.kwic('fail', Children='No')
+    index.phrase('visit time')
+    index.near('children', 'visits', distance=5)
+'''
+
+
+class ConcordanceIndex(object):
+    def __init__(self, raw_tokens, docs, postings, offsets, terms):
+        '''
+        raw_tokens: the original tokens of every response, for display
+        docs: DataFrame with a row per response (row label, column, group columns)
+        postings: (doc, position) int64 arrays sorted by term, then doc and position
+        offsets: where each term's postings start
+        terms: term -> index into offsets
+        '''
+        self.raw_tokens = raw_tokens
+        self.docs = docs
+        self.post_doc, self.post_pos = postings
+        self.offsets = offsets
+        self.terms = terms
+        self._stride = max((len(t) for t in raw_tokens), default=0) + 1
+
+    @classmethod
+    def from_frame(cls, df, columns, group_cols=()):
+        import numpy as np
+        import pandas as pd
+        from nltk.tokenize import wordpunct_tokenize
+        from iprt.text import stemmer
+
+        stem = stemmer().stem
+        if isinstance(columns, str):
+            columns = [columns]
+        raw_tokens = []
+        rows = []
+        terms = {}
+        term_ids = []
+        doc_ids = []
+        positions = []
+        normalised = {}
+        for column in columns:
+            for label, text in df[column].dropna().items():
+                tokens = wordpunct_tokenize(text)
+                doc = len(raw_tokens)
+                raw_tokens.append(tokens)
+                rows.append([label, column] + [df.at[label, col] for col in group_cols])
+                for pos, token in enumerate(tokens):
+                    if token not in normalised:
+                        normalised[token] = stem(token.lower())
+                    term_ids.append(terms.setdefault(normalised[token], len(terms)))
+                    doc_ids.append(doc)
+                    positions.append(pos)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int64)
+        # tokens were added in (doc, position) order, so a stable sort by term
+        # leaves each term's postings sorted by doc and position
+        order = np.argsort(term_ids, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=len(terms)))])
+        docs = pd.DataFrame(rows, columns=['row', 'column'] + list(group_cols))
+        return cls(raw_tokens, docs, (doc_ids[order], positions[order]), offsets, terms)
+
+    def normalise(self, word):
+        from iprt.text import stemmer
+        return stemmer().stem(word.lower())
+
+    def tokenize(self, text):
+        '''the tokens of a query, split as the responses were ("can't" is can ' t)'''
+        from nltk.tokenize import wordpunct_tokenize
+        return wordpunct_tokenize(text)
+
+    def postings(self, word):
+        '''(docs, positions) of a word'''
+        import numpy as np
+
+        t = self.terms.get(self.normalise(word))
+        if t is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return self.post_doc[self.offsets[t]:self.offsets[t + 1]], self.post_pos[self.offsets[t]:self.offsets[t + 1]]
+
+    def _keys(self, word, shift=0):
+        # one integer per occurrence, doc * stride + position - shift. Shifts
+        # that would move off either end of the response are dropped.
+        docs, positions = self.postings(word)
+        shifted = positions - shift
+        keep = (shifted >= 0) & (shifted < self._stride)
+        return docs[keep] * self._stride + shifted[keep]
+
+    def _filter(self, keys, filters):
+        import numpy as np
+
+        if not filters:
+            return keys
+        allowed = np.ones(len(self.docs), dtype=bool)
+        for col, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            allowed &= self.docs[col].isin(values).values
+        return keys[allowed[keys // self._stride]]
+
+    def _hits(self, keys, length):
+        return [(int(k // self._stride), int(k % self._stride), length) for k in keys]
+
+    def find(self, word, **filters):
+        '''[(doc, position, length)] of every use of a word (or of a phrase, for a word such as "can't")'''
+        words = self.tokenize(word)
+        if len(words) != 1:
+            return self.phrase(words, **filters)
+        return self._hits(self._filter(self._keys(words[0]), filters), 1)
+
+    def phrase(self, text, **filters):
+        '''[(doc, position, length)] of every use of the words of text in sequence'''
+        import numpy as np
+
+        words = self.tokenize(text) if isinstance(text, str) else list(text)
+        if not words:
+            return []
+        keys = self._keys(words[0])
+        for i, word in enumerate(words[1:], 1):
+            keys = np.intersect1d(keys, self._keys(word, shift=i), assume_unique=True)
+        return self._hits(self._filter(keys, filters), len(words))
+
+    def near(self, word1, word2, distance=5, **filters):
+        '''[(doc, position, length)] of word1 with word2 within distance words either side'''
+        import numpy as np
+
+        keys1 = self._keys(word1)
+        matched = np.zeros(len(keys1), dtype=bool)
+        for shift in range(-distance, distance + 1):
+            if shift != 0:
+                matched |= np.isin(keys1, self._keys(word2, shift=shift))
+        keys = self._filter(keys1[matched], filters)
+        return self._hits(keys, 1)
+
+    def kwic(self, word, width=5, **filters):
+        '''keyword in context lines: (row label, column, left, keyword, right)'''
+        return self.context(self.find(word, **filters), width)
+
+    def context(self, hits, width=5):
+        out = []
+        for doc, pos, length in hits:
+            tokens = self.raw_tokens[doc]
+            out.append((self.docs.at[doc, 'row'], self.docs.at[doc, 'column'],
+                        ' '.join(tokens[max(pos - width, 0):pos]),
+                        ' '.join(tokens[pos:pos + length]),
+                        ' '.join(tokens[pos + length:pos + length + width])))
+        return out
+
+    def print_kwic(self, word, width=5, **filters):
+        lines = self.kwic(word, width, **filters)
+        left_width = max([len(line[2]) for line in lines] + [0])
+        for _, _, left, keyword, right in lines:
+            print(left.rjust(left_width) + ' ' + keyword + ' ' + right)
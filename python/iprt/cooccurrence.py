@@ -0,0 +1,145 @@
+'''
+Words used near each other, not just next to each other.
+
+Bigrams only see adjacent words, so themes like "visits ... children ...
+time" spread over a sentence are missed. Here every pair of words within
+window positions of each other in the same response is counted, straight
+from the token id array of the token store: for each distance 1..window the
+pairs are one shifted slice of the array, kept where both ends are in the
+same response. The counts go into a sparse symmetric words x words matrix,
+which is weighted with positive pointwise mutual information (PPMI).
+
+    net = cooccurrence_network(df, 'thoughts_facs', group_col='Age', window=5)
+    net[net['group'] == '18 - 24'].head(20)
+'''
+
+
+def pair_arrays(store, window=5):
+    '''(docs, left ids, right ids) of every word pair within window of each other'''
+    import numpy as np
+
+    doc = store.doc_of_position()
+    ids = store.ids.astype(np.int64)
+    docs, left, right = [], [], []
+    for d in range(1, window + 1):
+        if d >= len(ids):
+            break
+        same = doc[:-d] == doc[d:]
+        docs.append(doc[:-d][same])
+        left.append(ids[:-d][same])
+        right.append(ids[d:][same])
+    if not docs:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(docs), np.concatenate(left), np.concatenate(right)
+
+
+def cooccurrence_matrix(store, window=5, docs_mask=None, pairs=None, per_response=False):
+    '''
+    sparse symmetric words x words counts of pairs within window, optionally
+    only from the responses where docs_mask is True. With per_response, a
+    pair counts at most once per response.
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    docs, left, right = pairs if pairs is not None else pair_arrays(store, window)
+    keep = left != right
+    if docs_mask is not None:
+        keep &= docs_mask[docs]
+    docs, left, right = docs[keep], left[keep], right[keep]
+    a = np.minimum(left, right)
+    b = np.maximum(left, right)
+    if per_response:
+        v = len(store.vocab)
+        _, first = np.unique((docs * v + a) * v + b, return_index=True)
+        a, b = a[first], b[first]
+    v = len(store.vocab)
+    upper = sparse.coo_matrix((np.ones(len(a), dtype=np.int64), (a, b)), shape=(v, v)).tocsr()
+    upper.sum_duplicates()
+    return (upper + upper.T).tocsr()
+
+
+def ppmi(counts, alpha=0.75):
+    '''
+    positive PMI of a symmetric count matrix, as a sparse matrix with the same
+    non-zeros. alpha < 1 smooths the context distribution (Levy et al. 2015)
+    so rare words do not get inflated scores.
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    counts = sparse.csr_matrix(counts, dtype=float)
+    total = counts.sum()
+    if total == 0:
+        return counts
+    row = np.asarray(counts.sum(axis=1)).ravel()
+    context = row ** alpha
+    coo = counts.tocoo()
+    p_ij = coo.data / total
+    p_i = row[coo.row] / total
+    p_j = context[coo.col] / context.sum()
+    pmi = np.log(p_ij / (p_i * p_j))
+    keep = pmi > 0
+    return sparse.csr_matrix((pmi[keep], (coo.row[keep], coo.col[keep])), shape=counts.shape)
+
+
+def edge_table(store, counts, weights, min_count=2, top_n=None):
+    '''
+    one row per word pair (source < target) with its count and PPMI, pairs
+    seen fewer than min_count times dropped; with top_n, only each word's
+    top_n strongest associations are kept
+    '''
+    import numpy as np
+    import pandas as pd
+    from scipy import sparse
+
+    upper = sparse.triu(weights, k=1).tocoo()
+    count = np.asarray(counts[upper.row, upper.col]).ravel()
+    edges = pd.DataFrame({'source': np.asarray(store.vocab, dtype=object)[upper.row],
+                          'target': np.asarray(store.vocab, dtype=object)[upper.col],
+                          'count': count, 'ppmi': upper.data})
+    edges = edges[edges['count'] >= min_count]
+    if top_n is not None:
+        both = pd.concat([edges.assign(word=edges['source']), edges.assign(word=edges['target'])])
+        both = both.sort_values('ppmi', ascending=False).groupby('word').head(top_n)
+        edges = both.drop(columns='word').drop_duplicates(['source', 'target'])
+    return edges.sort_values('ppmi', ascending=False).reset_index(drop=True)
+
+
+def cooccurrence_network(df, column_name, group_col=None, window=5, min_count=2, top_n=None,
+                         per_response=False, store=None):
+    '''
+    edge table of associated words, with a group column (None for the whole
+    survey when group_col is not given)
+    '''
+    import pandas as pd
+    from iprt.tokens import TokenStore
+
+    if store is None:
+        store = TokenStore.from_frame(df, column_name)
+    pairs = pair_arrays(store, window)
+
+    if group_col is None:
+        groups = [(None, None)]
+    else:
+        labels = df.loc[store.doc_index, group_col].values
+        groups = [(g, labels == g) for g in pd.unique(labels[pd.notnull(labels)])]
+
+    frames = []
+    for group, mask in groups:
+        counts = cooccurrence_matrix(store, window, docs_mask=mask, pairs=pairs, per_response=per_response)
+        edges = edge_table(store, counts, ppmi(counts), min_count=min_count, top_n=top_n)
+        edges.insert(0, 'group', group)
+        frames.append(edges)
+    return pd.concat(frames, ignore_index=True)
+
+
+def to_networkx(edges):
+    '''a networkx graph per group (networkx is only needed for this)'''
+    import networkx as nx
+
+    graphs = {}
+    for group, grp in edges.groupby('group', dropna=False):
+        graphs[group] = nx.from_pandas_edgelist(grp, 'source', 'target', edge_attr=['count', 'ppmi'])
+    return graphs
@@ -0,0 +1,150 @@
+'''
+Near duplicate free text responses.
+
+final_sprint1_nlp.py notes that common responses turn up on common days,
+i.e. copied or templated answers, and each copy adds to the bigram counts.
+Duplicates are found with MinHash and locality sensitive hashing over the
+word shingles of each response (k token ids in a row, from the token store):
+- every response gets a signature of num_perm minimum shingle hashes, all
+  computed as numpy array operations
+- signatures are cut into bands, and responses sharing a band land in the
+  same bucket; only bucket members are compared (against the bucket's first
+  member), so the work grows with the number of responses, not its square
+- responses whose estimated Jaccard similarity is at least threshold are
+  joined into clusters
+
+find_duplicates gives every response its cluster, the cluster size, a weight
+of 1 / cluster size for down-weighting and a flag for one representative per
+cluster for dropping the rest.
+'''
+
+# multiply-shift hashing of 64 bit shingle keys
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingle_keys(store, k=3):
+    '''
+    (docs, keys): one integer per k-shingle of each response. Responses
+    shorter than k words are one shingle of all their words.
+    '''
+    import numpy as np
+
+    # the shingle length goes in the low 3 bits, so len(vocab) ** k must be
+    # under 2 ** 60 (a vocabulary of up to a million for k=3)
+    if max(len(store.vocab), 1) ** k >= 2 ** 60:
+        raise ValueError('%d-shingle keys of a %d word vocabulary do not fit in 64 bits' % (k, len(store.vocab)))
+    docs, keys = store.ngram_keys(k)
+    keys = keys * 8 + k
+    lengths = store.doc_lengths()
+    short = np.flatnonzero((lengths > 0) & (lengths < k))
+    if len(short):
+        base = max(len(store.vocab), 1)
+        short_keys = []
+        for d in short:
+            key = 0
+            for t in store.ids[store.offsets[d]:store.offsets[d + 1]]:
+                key = key * base + int(t)
+            short_keys.append(key * 8 + int(lengths[d]))
+        docs = np.concatenate([docs, short])
+        keys = np.concatenate([keys, np.asarray(short_keys, dtype=np.int64)])
+        order = np.argsort(docs, kind='stable')
+        docs, keys = docs[order], keys[order]
+    return docs, keys
+
+
+def minhash_signatures(store, k=3, num_perm=128, seed=0):
+    '''
+    (signatures, has_text): a responses x num_perm array of minimum hashes,
+    and which responses had any words at all
+    '''
+    import numpy as np
+
+    docs, keys = shingle_keys(store, k)
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 2 ** 62, size=num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.randint(0, 2 ** 62, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    signatures = np.full((len(store), num_perm), _MAX_HASH, dtype=np.uint64)
+    has_text = np.zeros(len(store), dtype=bool)
+    if len(keys) == 0:
+        return signatures, has_text
+
+    # shingles are grouped by response, so each response is one reduceat segment
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(docs)) + 1])
+    with_shingles = docs[starts]
+    has_text[with_shingles] = True
+    x = keys.astype(np.uint64)
+    with np.errstate(over='ignore'):
+        for i in range(num_perm):
+            hashes = (a[i] * x + b[i]) >> np.uint64(32)
+            signatures[with_shingles, i] = np.minimum.reduceat(hashes, starts)
+    return signatures, has_text
+
+
+def lsh_clusters(signatures, has_text=None, bands=32, threshold=0.8):
+    '''cluster label of every response; responses without text are their own cluster'''
+    import numpy as np
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components
+
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    candidates = np.flatnonzero(has_text) if has_text is not None else np.arange(n)
+    sig = signatures[candidates]
+
+    edges_from = []
+    edges_to = []
+    for band in range(bands):
+        block = np.ascontiguousarray(sig[:, band * rows:(band + 1) * rows])
+        _, bucket = np.unique(block, axis=0, return_inverse=True)
+        bucket = bucket.ravel()
+        # the first member of each bucket stands for it
+        first = np.full(bucket.max() + 1 if len(bucket) else 0, len(bucket), dtype=np.int64)
+        np.minimum.at(first, bucket, np.arange(len(bucket)))
+        rep = first[bucket]
+        others = np.flatnonzero(rep != np.arange(len(bucket)))
+        if len(others) == 0:
+            continue
+        similarity = (sig[others] == sig[rep[others]]).mean(axis=1)
+        close = others[similarity >= threshold]
+        edges_from.append(close)
+        edges_to.append(rep[close])
+
+    if edges_from:
+        edges_from = np.concatenate(edges_from)
+        edges_to = np.concatenate(edges_to)
+    else:
+        edges_from = edges_to = np.zeros(0, dtype=np.int64)
+    graph = sparse.csr_matrix((np.ones(len(edges_from)), (edges_from, edges_to)),
+                              shape=(len(candidates), len(candidates)))
+    _, labels = connected_components(graph, directed=False)
+
+    out = np.arange(n, dtype=np.int64) + (labels.max() + 1 if len(labels) else 0)
+    out[candidates] = labels
+    return out
+
+
+def find_duplicates(df, column_name, k=3, num_perm=128, bands=32, threshold=0.8, seed=0, store=None):
+    '''
+    DataFrame indexed by the row labels of the non-empty responses, with
+    columns cluster, cluster_size, weight (1 / cluster_size) and
+    representative (True for the first response of each cluster)
+    '''
+    import numpy as np
+    import pandas as pd
+    from iprt.tokens import TokenStore
+
+    if store is None:
+        store = TokenStore.from_frame(df, column_name)
+    signatures, has_text = minhash_signatures(store, k=k, num_perm=num_perm, seed=seed)
+    labels = lsh_clusters(signatures, has_text, bands=bands, threshold=threshold)
+    _, first, inverse, sizes = np.unique(labels, return_index=True, return_inverse=True, return_counts=True)
+    representative = np.zeros(len(labels), dtype=bool)
+    representative[first] = True
+    return pd.DataFrame({'cluster': inverse.ravel(), 'cluster_size': sizes[inverse.ravel()],
+                         'weight': 1.0 / sizes[inverse.ravel()], 'representative': representative},
+                        index=store.doc_index)
+
+
+def duplicates_stage(df, column, k=3, num_perm=128, bands=32, threshold=0.8):
+    return find_duplicates(df, column, k=k, num_perm=num_perm, bands=bands, threshold=threshold)
@@ -0,0 +1,100 @@
+'''
+Words and n-grams that are distinctive of a group, rather than just common
+in it.
+
+The common_words tables rank by raw counts, so every group shows the same
+frequent stems (visit, famili, ...). Here each group is scored against the
+others from the groups x terms count matrix of rollup.NgramRollup, for all
+groups at once:
+- tfidf: term frequency in the group times log inverse group frequency
+- log_odds: weighted log-odds ratio of the group against the rest, with an
+  informative Dirichlet prior taken from the whole survey (Monroe, Colaresi
+  and Quinn, 2008, "Fightin' Words"). The scores are z-scores, so rare terms
+  are not ranked on a couple of uses.
+
+    distinctive_terms(df, 'thoughts_facs', 'Children', k=10)
+'''
+
+
+def tfidf(counts):
+    '''groups x terms tf-idf as a dense array (smoothed idf, as in scikit-learn)'''
+    import numpy as np
+    from scipy import sparse
+
+    counts = sparse.csr_matrix(counts, dtype=float)
+    n_groups = counts.shape[0]
+    lengths = np.asarray(counts.sum(axis=1)).ravel()
+    tf = sparse.diags(1.0 / np.maximum(lengths, 1)).dot(counts)
+    group_freq = np.asarray((counts > 0).sum(axis=0)).ravel()
+    idf = np.log((1.0 + n_groups) / (1.0 + group_freq)) + 1.0
+    return np.asarray(tf.multiply(idf).todense())
+
+
+def log_odds(counts, prior_scale=None):
+    '''
+    z-scores of the weighted log-odds of each term in each group against all
+    other groups. The prior for each term is its share of the whole survey
+    times prior_scale (default: the total number of tokens, i.e. the survey
+    counts themselves).
+    '''
+    import numpy as np
+
+    y = np.asarray(counts.todense() if hasattr(counts, 'todense') else counts, dtype=float)
+    total = y.sum(axis=0)
+    n_total = total.sum()
+    if prior_scale is None:
+        prior_scale = n_total
+    alpha = prior_scale * total / max(n_total, 1.0)
+    alpha0 = alpha.sum()
+
+    y_rest = total - y
+    n_group = y.sum(axis=1, keepdims=True)
+    n_rest = n_total - n_group
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = (np.log(y + alpha) - np.log(n_group + alpha0 - y - alpha)
+                 - np.log(y_rest + alpha) + np.log(n_rest + alpha0 - y_rest - alpha))
+        variance = 1.0 / (y + alpha) + 1.0 / (y_rest + alpha)
+        z = delta / np.sqrt(variance)
+    return np.where(np.isfinite(z), z, 0.0)
+
+
+def top_k(scores, k=10, counts=None, min_count=1):
+    '''
+    column indices of the k best scores of every row, best first. With
+    counts, terms used fewer than min_count times in the group are skipped.
+    '''
+    import numpy as np
+
+    scores = np.array(scores, dtype=float)
+    if counts is not None:
+        counts = np.asarray(counts.todense() if hasattr(counts, 'todense') else counts)
+        scores[counts < min_count] = -np.inf
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(best, order, axis=1)
+
+
+def distinctive_terms(df, column_name, group_col, k=10, n=1, method='log_odds', min_count=2,
+                      rollup=None, prior_scale=None):
+    '''{group: [(term, score), ...]} of the k most distinctive terms per group'''
+    from iprt.rollup import NgramRollup
+
+    if rollup is None:
+        rollup = NgramRollup.from_frame(df, column_name, [group_col], n=n)
+    groups, counts, _ = rollup.counts([group_col])
+    if method == 'tfidf':
+        scores = tfidf(counts)
+    elif method == 'log_odds':
+        scores = log_odds(counts, prior_scale=prior_scale)
+    else:
+        raise ValueError('method must be tfidf or log_odds, not ' + str(method))
+
+    best = top_k(scores, k, counts=counts, min_count=min_count)
+    out = {}
+    for g, group in enumerate(groups[group_col]):
+        out[group] = [(rollup.ngrams[t], float(scores[g, t])) for t in best[g] if counts[g, t] >= min_count]
+    return out
@@ -0,0 +1,157 @@
+'''
+All the results as long tables, written to Parquet for the dashboards and
+the R scripts.
+
+The nested {grouping column: {group: [...]}} dicts become one row per entry:
+
+    table, group_col, group, rank, ngram, n, score, count
+
+(score is the count for common words and the PMI for bigrams and trigrams),
+so groups with short lists - wing E's bigrams - are simply fewer rows. The
+sentiment of each response, the topics' top terms and prevalence, the
+bootstrap confidence intervals and the t-test scans get their own tables. write_parquet saves a dict of them in one
+go, one <name>.parquet per table (pip install iprt[parquet]); in R,
+arrow::read_parquet reads them as they are.
+'''
+
+import os
+
+NGRAM_COLUMNS = ['table', 'group_col', 'group', 'rank', 'ngram', 'n', 'score', 'count']
+
+
+def _ngram_rows(table, group_col, group, entries):
+    '''entries are (ngram, score, count) with the ngram a tuple of words'''
+    return [(table, group_col, group, rank, ' '.join(ngram), len(ngram), score, count)
+            for rank, (ngram, score, count) in enumerate(entries)]
+
+
+def ngram_frame(ngrams):
+    '''
+    the long table of grouped_ngrams / the pipeline's ngrams output, given as
+    a dict {'common_words': ..., 'bigrams_phrases': ..., 'trigrams_phrases': ...}
+    or the (common_words, bigrams_phrases, trigrams_phrases) tuple. These keep
+    no PMI, so bigram and trigram scores are empty; see scored_ngrams.
+    '''
+    import pandas as pd
+
+    if isinstance(ngrams, tuple):
+        ngrams = dict(zip(['common_words', 'bigrams_phrases', 'trigrams_phrases'], ngrams))
+    rows = []
+    for table, by_col in ngrams.items():
+        for col, by_group in by_col.items():
+            for group, entries in by_group.items():
+                if table == 'common_words':
+                    entries = [((word,), count, count) for word, count in entries]
+                else:
+                    entries = [(tuple(ngram), None, None) for ngram in entries]
+                rows.extend(_ngram_rows(table, col, group, entries))
+    return _ngram_types(pd.DataFrame(rows, columns=NGRAM_COLUMNS))
+
+
+def scored_ngrams(df, column_name, group_cols, filter_freq=3, no2return=10):
+    '''
+    the same tables as text.grouped_ngrams (nbest is the top of score_ngrams),
+    with the PMI and count of every bigram and trigram
+    '''
+    from collections import Counter
+
+    import pandas as pd
+    from nltk.collocations import (BigramAssocMeasures, BigramCollocationFinder, TrigramAssocMeasures,
+                                   TrigramCollocationFinder)
+    from iprt import text
+
+    rows = []
+    for col in group_cols:
+        for group, grp in df.groupby(col):
+            tokens = text.make_tkn_text(grp, column_name)
+            common = Counter(tokens).most_common(no2return)
+            rows.extend(_ngram_rows('common_words', col, group, [((w,), c, c) for w, c in common]))
+            for table, finder, measure in [
+                    ('bigrams_phrases', BigramCollocationFinder.from_words(tokens), BigramAssocMeasures.pmi),
+                    ('trigrams_phrases', TrigramCollocationFinder.from_words(tokens), TrigramAssocMeasures.pmi)]:
+                finder.apply_freq_filter(filter_freq)
+                best = finder.score_ngrams(measure)[:no2return]
+                rows.extend(_ngram_rows(table, col, group, [(g, s, finder.ngram_fd[g]) for g, s in best]))
+    return _ngram_types(pd.DataFrame(rows, columns=NGRAM_COLUMNS))
+
+
+def _ngram_types(frame):
+    # one type per column, whatever the grouping columns hold
+    frame['group_col'] = frame['group_col'].astype(str)
+    frame['group'] = frame['group'].astype(str)
+    frame['score'] = frame['score'].astype(float)
+    frame['count'] = frame['count'].astype('Int64')
+    return frame
+
+
+def sentiment_frame(scores, df=None, group_cols=()):
+    '''one row per response: its index label, sentiment and grouping columns'''
+    frame = scores.rename('sentiment').to_frame()
+    if df is not None:
+        for col in group_cols:
+            frame[col] = df.loc[frame.index, col].astype(str).values
+    frame.index.name = 'response'
+    return frame.reset_index()
+
+
+def ci_frame(cis, irish=None):
+    '''
+    the bootstrap.children_cis table (and its extrapolate version), one row
+    per scope ('survey', 'ireland') and child column
+    '''
+    import pandas as pd
+
+    frames = [cis.assign(scope='survey')]
+    if irish is not None:
+        frames.append(irish.assign(scope='ireland'))
+    frame = pd.concat(frames)
+    frame.index.name = 'column'
+    return frame.reset_index()[['scope', 'column', 'label', 'total', 'ci_low', 'ci_high']]
+
+
+def scan_frame(scan, test='ttest'):
+    '''a breakdown.scan or significance.compare result, with the test named'''
+    frame = scan.reset_index(drop=True).copy()
+    frame.insert(0, 'test', test)
+    return frame
+
+
+def topic_frames(topics):
+    '''
+    the topics stage output as two long tables: top_terms (topic, rank, term)
+    and topic_prevalence (group_col, group, topic, share)
+    '''
+    import pandas as pd
+
+    terms = topics['top_terms']
+    top_terms = pd.DataFrame([(topic, rank, term) for topic in terms.columns
+                              for rank, term in enumerate(terms[topic].dropna())],
+                             columns=['topic', 'rank', 'term'])
+    rows = [(col, str(group), topic, float(share))
+            for col, table in topics['topic_prevalence'].items()
+            for group, row in table.iterrows() for topic, share in row.items()]
+    prevalence = pd.DataFrame(rows, columns=['group_col', 'group', 'topic', 'share'])
+    return top_terms, prevalence
+
+
+def pipeline_frames(outputs, df=None, group_cols=()):
+    '''the exportable pipeline outputs (ngrams, sentiment, topics) as long tables'''
+    frames = {}
+    if 'ngrams' in outputs:
+        frames['ngrams'] = ngram_frame(outputs['ngrams'])
+    if 'sentiment' in outputs:
+        frames['sentiment'] = sentiment_frame(outputs['sentiment'], df, group_cols)
+    if 'topics' in outputs:
+        frames['top_terms'], frames['topic_prevalence'] = topic_frames(outputs['topics'])
+    return frames
+
+
+def write_parquet(frames, output_dir):
+    '''write {name: DataFrame} as output_dir/<name>.parquet, returning the paths'''
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name, frame in frames.items():
+        path = os.path.join(output_dir, name + '.parquet')
+        frame.to_parquet(path, index=False)
+        paths.append(path)
+    return paths
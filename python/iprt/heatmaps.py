@@ -0,0 +1,104 @@
+'''
+Heat maps of the binary facility and family contact fields (the "Binary
+Fields" cells of final_sprint1_nlp.py).
+
+The notebook ran a separate groupby().sum() for every heat map. Here the
+sums are computed once at the finest grain (every combination of age,
+sentence_length and prison_wing_main) and rolled up from there into every
+grouping set: each single dimension, each pair and the grand total. A heat
+map is then a lookup in the cube, and the cube can be saved to disk.
+'''
+
+from itertools import combinations
+
+DIMENSIONS = ['age', 'sentence_length', 'prison_wing_main']
+FIELD_PREFIXES = {
+    'contact': 'improve_contact_family',
+    'facilities': 'prison_service_facilities',
+}
+
+
+def binary_columns(df, prefixes=None):
+    '''the numeric columns of the contact and facilities questions'''
+    if prefixes is None:
+        prefixes = list(FIELD_PREFIXES.values())
+    numeric = df.select_dtypes(include='number').columns
+    return [col for col in numeric if any(p in str(col) for p in prefixes)]
+
+
+class Cube(object):
+    '''
+    sums of the binary columns, and the number of respondents 'n', for every
+    grouping set of the dimensions. tables maps a tuple of dimensions (the
+    empty tuple for the grand total) to a DataFrame indexed by those dimensions.
+    '''
+
+    def __init__(self, tables, dimensions, value_cols):
+        self.tables = tables
+        self.dimensions = list(dimensions)
+        self.value_cols = list(value_cols)
+
+    @classmethod
+    def build(cls, df, dimensions=None, value_cols=None, max_set_size=2):
+        import pandas as pd
+
+        dimensions = list(dimensions or [d for d in DIMENSIONS if d in df.columns])
+        value_cols = list(value_cols or binary_columns(df))
+
+        # the one pass over the rows
+        data = df[dimensions + value_cols].copy()
+        data[value_cols] = data[value_cols].fillna(0)
+        data['n'] = 1
+        finest = data.groupby(dimensions, dropna=False, sort=True)[value_cols + ['n']].sum()
+
+        # everything else is rolled up from the finest grain. Respondents
+        # with no value for a dimension are left out of that dimension's
+        # breakdowns but counted in the grand total. This differs from the
+        # notebook, which filled the dimension columns with 0 too, so its
+        # heat maps had an extra 0 row of the missing values.
+        tables = {}
+        for size in range(1, min(max_set_size, len(dimensions)) + 1):
+            for dims in combinations(dimensions, size):
+                if size == len(dimensions):
+                    tables[dims] = finest[finest.index.to_frame().notna().all(axis=1).values]
+                else:
+                    tables[dims] = finest.groupby(level=list(dims), sort=True).sum()
+        tables[()] = pd.DataFrame([finest.sum()], index=pd.Index(['All'], name='total'))
+        return cls(tables, dimensions, value_cols)
+
+    def lookup(self, dims=(), field=None):
+        '''
+        the table for a grouping set, e.g. cube.lookup(['age'], 'contact'),
+        optionally restricted to the contact or facilities columns
+        '''
+        if isinstance(dims, str):
+            dims = [dims]
+        dims = tuple(d for d in self.dimensions if d in dims)
+        table = self.tables[dims]
+        if field is not None:
+            prefix = FIELD_PREFIXES.get(field, field)
+            table = table[[col for col in self.value_cols if prefix in str(col)]]
+        return table
+
+    def save(self, path):
+        import pickle
+        with open(path, 'wb') as f:
+            pickle.dump({'tables': self.tables, 'dimensions': self.dimensions,
+                         'value_cols': self.value_cols}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        import pickle
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        return cls(state['tables'], state['dimensions'], state['value_cols'])
+
+
+def heatmap(cube, dims, field, ax=None):
+    '''e.g. heatmap(cube, 'age', 'contact') for the "Family contact: By Age" plot'''
+    import seaborn as sns
+    return sns.heatmap(cube.lookup(dims, field).T, ax=ax)
+
+
+def cube_stage(df, dimensions=None, max_set_size=2):
+    return Cube.build(df, dimensions=dimensions, max_set_size=max_set_size)
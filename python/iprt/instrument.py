@@ -0,0 +1,178 @@
+'''
+Where the time of a run goes, stage by stage.
+
+The analysis functions mark their stages (load, tokenize, stem, spell,
+count, collocations, sentiment, render, bootstrap, ...) with
+
+    with instrument.stage('load') as span:
+        df = ...
+        span.items = len(df)
+
+or the @instrumented('bootstrap') decorator. Nothing is recorded unless a
+Recorder is active, and then every stage adds its wall time, CPU time and
+item count to the totals of its path (the stack of stages it ran inside,
+e.g. pipeline;stage:ngrams;make_tkn_text;spell), along with the peak RSS of
+the process when it finished. Totals rather than single calls are kept, so
+stages inside per-response loops cost a few microseconds and no memory.
+
+    with instrument.Recorder() as recorder:
+        pipe.run()
+    recorder.write('run_report.json')  # also run_report.folded for flamegraph.pl / speedscope
+
+Only the standard library is imported here, so marking a stage does not
+slow down the cli start up.
+'''
+
+import functools
+import json
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+_active = None  # the Recorder in use, if any
+
+
+def peak_rss():
+    '''the largest resident set size of this process so far, in bytes (None if unknown)'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024  # kilobytes on Linux
+
+
+class _NullSpan(object):
+    items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass  # items set on a disabled stage are dropped
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span(object):
+    def __init__(self, recorder, name, items=None):
+        self.recorder = recorder
+        self.name = name
+        self.items = items
+        self.child_wall = 0.0
+
+    def __enter__(self):
+        self.recorder._stack.append(self)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        stack = self.recorder._stack
+        path = ';'.join(span.name for span in stack)
+        stack.pop()
+        if stack:
+            stack[-1].child_wall += wall
+        self.recorder._add(path, wall, cpu, wall - self.child_wall, self.items)
+        return False
+
+
+class Recorder(object):
+    def __init__(self):
+        self.totals = {}  # path -> {'calls', 'wall_s', 'cpu_s', 'self_s', 'items', 'peak_rss'}
+        self._stack = []
+        self._previous = None
+        self.started = None
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        _active = self
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        return False
+
+    def _add(self, path, wall, cpu, self_wall, items):
+        total = self.totals.get(path)
+        if total is None:
+            total = self.totals[path] = {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'self_s': 0.0,
+                                         'items': 0, 'peak_rss': None}
+        total['calls'] += 1
+        total['wall_s'] += wall
+        total['cpu_s'] += cpu
+        total['self_s'] += self_wall
+        if items is not None:
+            total['items'] += int(items)
+        total['peak_rss'] = peak_rss()
+
+    def report(self):
+        '''the totals as a list of dicts, one per stage path, in the order they first finished'''
+        rows = []
+        for path, total in self.totals.items():
+            row = {'path': path, 'stage': path.rsplit(';', 1)[-1]}
+            row.update(total)
+            rows.append(row)
+        return {'started': self.started, 'peak_rss': peak_rss(), 'stages': rows}
+
+    def collapsed(self):
+        '''flamegraph "collapsed stack" lines: path and self time in microseconds'''
+        return ['%s %d' % (path, round(total['self_s'] * 1e6)) for path, total in self.totals.items()]
+
+    def write(self, path):
+        '''the JSON report at path, and the collapsed stacks next to it as .folded'''
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+        with open(os.path.splitext(path)[0] + '.folded', 'w') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+        return path
+
+    def summary(self):
+        '''a printable table of the stages, slowest first'''
+        lines = ['%-60s %8s %10s %10s %12s %10s' % ('stage', 'calls', 'wall s', 'cpu s', 'items', 'peak MB')]
+        for path, total in sorted(self.totals.items(), key=lambda kv: -kv[1]['wall_s']):
+            rss = '%.0f' % (total['peak_rss'] / 2.0 ** 20) if total['peak_rss'] else '-'
+            lines.append('%-60s %8d %10.3f %10.3f %12d %10s' % (path[-60:], total['calls'], total['wall_s'],
+                                                              total['cpu_s'], total['items'], rss))
+        return '\n'.join(lines)
+
+
+def active():
+    return _active
+
+
+def stage(name, items=None):
+    '''a context manager timing name, or a no-op when no Recorder is active'''
+    if _active is None:
+        return _NULL_SPAN
+    return Span(_active, name, items)
+
+
+def instrumented(name, count=None):
+    '''
+    decorator timing every call as stage name; count, if given, is a function
+    of the result giving the number of items processed
+    '''
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with stage(name) as span:
+                result = func(*args, **kwargs)
+                if count is not None:
+                    span.items = count(result)
+                return result
+        return wrapper
+    return decorate
@@ -0,0 +1,253 @@
+'''
+Word, bigram and trigram counts over a survey split into many files.
+
+Each partition (a csv or xlsx file per prison or survey wave) is mapped to a
+CountState: its vocabulary, and for every grouping column and group an
+array of token id tuples with their counts. States merge by remapping one
+vocabulary onto the other and summing equal id tuples - merging is
+associative and commutative, so partitions can be reduced in any order, in
+a local process pool or on a Dask cluster:
+
+    paths = partition_paths('waves/*.csv')
+    state = count_partitions(paths, 'thoughts_facs', ['Age'], scheduler='dask')
+    common_words, bigrams_phrases, trigrams_phrases = ngram_tables(state, ['Age'])
+
+Unlike make_tkn_text, n-grams do not run from one response into the next
+(there is no "next" response across files); responses are tokenized as in
+tokens.TokenStore. Ties are broken alphabetically, so the tables do not
+depend on the order partitions were merged in.
+
+A survey already tokenized into a saved store is counted the same way by
+count_store, the workers each taking a slice of responses. Such a store
+pickles as its path, so the workers memory map the one copy on disk:
+
+    store = tokens.cached_store(df, 'thoughts_facs')
+    state = count_store(store, df.loc[store.doc_index, ['Age']])
+'''
+
+import glob
+
+ALL = 'All'  # the group of the overall counts, under grouping column None
+
+
+def partition_paths(pattern):
+    return sorted(glob.glob(pattern))
+
+
+def _aggregate(ids, counts):
+    '''sum the counts of equal id tuples'''
+    import numpy as np
+
+    if len(ids) == 0:
+        return ids, counts
+    unique, inverse = np.unique(ids, axis=0, return_inverse=True)
+    summed = np.zeros(len(unique), dtype=np.int64)
+    np.add.at(summed, inverse.ravel(), counts)
+    return unique, summed
+
+
+class CountState(object):
+    def __init__(self, vocab, tables, responses=None):
+        self.vocab = list(vocab)
+        # {(grouping column, group): {n: (ids array of shape (m, n), counts)}}
+        self.tables = tables
+        self.responses = responses if responses is not None else {}  # responses per (column, group)
+
+    @classmethod
+    def from_store(cls, store, groups, max_n=3):
+        '''
+        store: a tokens.TokenStore; groups: DataFrame of the grouping columns,
+        one row per response in the store
+        '''
+        import numpy as np
+        import pandas as pd
+
+        labels = [(None, np.full(len(store), ALL, dtype=object))]
+        labels += [(col, groups[col].values) for col in groups.columns]
+        base = max(len(store.vocab), 1)
+        tables = {}
+        responses = {}
+        for n in range(1, max_n + 1):
+            docs, keys = store.ngram_keys(n)
+            for col, values in labels:
+                doc_groups = values[docs]
+                for group in pd.unique(values[pd.notnull(values)]):
+                    unique, counts = np.unique(keys[doc_groups == group], return_counts=True)
+                    ids = np.empty((len(unique), n), dtype=np.int32)
+                    for i in range(n - 1, -1, -1):
+                        ids[:, i] = unique % base
+                        unique = unique // base
+                    tables.setdefault((col, group), {})[n] = (ids, counts.astype(np.int64))
+                    if n == 1:
+                        responses[(col, group)] = int(np.sum(values == group))
+        return cls(store.vocab, tables, responses)
+
+    def merge(self, other):
+        import numpy as np
+
+        # other's words go after ours, new ones appended
+        vocab = list(self.vocab)
+        index = dict((w, i) for i, w in enumerate(vocab))
+        lookup = []
+        for w in other.vocab:
+            if w not in index:
+                index[w] = len(vocab)
+                vocab.append(w)
+            lookup.append(index[w])
+        lookup = np.asarray(lookup, dtype=np.int32)
+
+        tables = dict((key, dict(by_n)) for key, by_n in self.tables.items())
+        for key, by_n in other.tables.items():
+            mine = tables.setdefault(key, {})
+            for n, (ids, counts) in by_n.items():
+                ids = lookup[ids] if len(ids) else ids
+                if n in mine:
+                    ids = np.concatenate([mine[n][0], ids])
+                    counts = np.concatenate([mine[n][1], counts])
+                mine[n] = _aggregate(ids, counts)
+        responses = dict(self.responses)
+        for key, count in other.responses.items():
+            responses[key] = responses.get(key, 0) + count
+        return CountState(vocab, tables, responses)
+
+    def counts(self, group_col, group, n):
+        '''(n-grams, counts) of a group, n-grams as tuples (terms for n=1)'''
+        import numpy as np
+
+        ids, counts = self.tables.get((group_col, group), {}).get(n, (np.zeros((0, n), dtype=np.int32),
+                                                                       np.zeros(0, dtype=np.int64)))
+        vocab = np.asarray(self.vocab, dtype=object)
+        if n == 1:
+            return list(vocab[ids[:, 0]]), counts
+        return [tuple(row) for row in vocab[ids]], counts
+
+    def top_words(self, group_col, group, k=10):
+        '''[(word, count)], most common first'''
+        words, counts = self.counts(group_col, group, 1)
+        return sorted(zip(words, counts.tolist()), key=lambda wc: (-wc[1], wc[0]))[:k]
+
+    def top_pmi(self, group_col, group, n=2, filter_freq=3, k=10):
+        '''
+        n-grams seen at least filter_freq times ranked by PMI, computed the way
+        nltk's BigramAssocMeasures.pmi / TrigramAssocMeasures.pmi do
+        '''
+        import numpy as np
+
+        ids, counts = self.tables.get((group_col, group), {}).get(n, (None, None))
+        if ids is None or len(ids) == 0:
+            return []
+        word_ids, word_counts = self.tables[(group_col, group)][1]
+        marginal = np.zeros(len(self.vocab), dtype=np.int64)
+        marginal[word_ids[:, 0]] = word_counts
+        total = float(word_counts.sum())
+        keep = counts >= filter_freq
+        ids, counts = ids[keep], counts[keep].astype(float)
+        denominator = np.ones(len(ids))
+        for i in range(n):
+            denominator = denominator * marginal[ids[:, i]]
+        scores = np.log2(counts * total ** (n - 1)) - np.log2(denominator)
+        vocab = np.asarray(self.vocab, dtype=object)
+        ranked = sorted(zip((-scores).tolist(), [tuple(row) for row in vocab[ids]]))
+        return [ngram for _, ngram in ranked[:k]]
+
+
+def map_partition(path, column_name, group_cols, max_n=3):
+    '''the CountState of one survey file'''
+    from iprt import survey
+    from iprt.tokens import TokenStore
+
+    df = survey.load_survey(path)
+    store = TokenStore.from_frame(df, column_name)
+    return CountState.from_store(store, df.loc[store.doc_index, list(group_cols)], max_n=max_n)
+
+
+def map_store_slice(store, start, stop, groups, max_n=3):
+    '''the CountState of responses start to stop of a store, groups being their rows'''
+    return CountState.from_store(store.slice(start, stop), groups, max_n=max_n)
+
+
+def _map_store_slice(job):
+    return map_store_slice(*job)
+
+
+def merge_states(a, b):
+    return a.merge(b)
+
+
+def _map_partition(job):
+    return map_partition(*job)
+
+
+def tree_reduce(states):
+    '''merge pairwise, so no single state grows much faster than the others'''
+    states = list(states)
+    while len(states) > 1:
+        merged = [a.merge(b) for a, b in zip(states[::2], states[1::2])]
+        if len(states) % 2:
+            merged.append(states[-1])
+        states = merged
+    return states[0] if states else CountState([], {})
+
+
+def count_partitions(paths, column_name, group_cols, max_n=3, scheduler='processes', processes=None,
+                     address=None):
+    '''
+    the merged CountState of every file in paths. scheduler is 'processes'
+    (a local process pool), 'serial', or 'dask' - a dask.bag fold on the
+    cluster at address, or on a new LocalCluster when address is None
+    '''
+    jobs = [(path, column_name, list(group_cols), max_n) for path in paths]
+    if scheduler == 'serial':
+        return tree_reduce(_map_partition(job) for job in jobs)
+    if scheduler == 'processes':
+        from iprt.parallel import process_pool
+        with process_pool(processes) as pool:
+            return tree_reduce(pool.map(_map_partition, jobs))
+    if scheduler == 'dask':
+        import dask.bag as db
+        from dask.distributed import Client, LocalCluster
+        from iprt import text
+
+        cluster = LocalCluster(n_workers=processes) if address is None else None
+        with Client(address or cluster) as client:
+            client.run(text.set_spell_checker, *text.spell_checker())  # the workers' spelling must match ours
+            bag = db.from_sequence(jobs, npartitions=max(len(jobs), 1)).map(_map_partition)
+            state = client.compute(bag.fold(merge_states)).result()
+        if cluster is not None:
+            cluster.close()
+        return state
+    raise ValueError('scheduler must be serial, processes or dask, not ' + str(scheduler))
+
+
+def count_store(store, groups, max_n=3, processes=None, responses_per_job=None):
+    '''
+    the CountState of a token store, counted slice by slice in a process pool
+    (in this process for processes=1). groups: DataFrame of the grouping
+    columns, one row per response in the store. Open the store with
+    tokens.open_store or cached_store, so the workers get its path rather
+    than a pickled copy of its arrays.
+    '''
+    import os
+
+    if responses_per_job is None:
+        responses_per_job = max(len(store) // (4 * (processes or os.cpu_count() or 1)), 1)
+    cuts = list(range(0, len(store), responses_per_job)) + [len(store)]
+    jobs = [(store, a, b, groups.iloc[a:b], max_n) for a, b in zip(cuts, cuts[1:])]
+    if processes == 1:
+        return tree_reduce(_map_store_slice(job) for job in jobs)
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return tree_reduce(pool.map(_map_store_slice, jobs))
+
+
+def ngram_tables(state, group_cols, filter_freq=3, no2return=10):
+    '''(common_words, bigrams_phrases, trigrams_phrases) in the layout of text.grouped_ngrams'''
+    common_words = {}
+    bigrams_phrases = {}
+    trigrams_phrases = {}
+    for col in group_cols:
+        groups = sorted(group for c, group in state.tables if c == col)
+        common_words[col] = dict((g, state.top_words(col, g, no2return)) for g in groups)
+        bigrams_phrases[col] = dict((g, state.top_pmi(col, g, 2, filter_freq, no2return)) for g in groups)
+        trigrams_phrases[col] = dict((g, state.top_pmi(col, g, 3, filter_freq, no2return)) for g in groups)
+    return common_words, bigrams_phrases, trigrams_phrases
@@ -0,0 +1,50 @@
+'''
+Shape masks for the word clouds.
+
+WordCloud treats pixels equal to 255 as "no drawing here". The children image
+is a JPEG, so the white background is only roughly 255, and it was re-read
+with PIL for every masked cloud. Here each image is loaded, optionally
+resized, thresholded to exact 0/255 values and saved as a .npy file once per
+(image contents, size, threshold). Worker processes open that file memory
+mapped, so all the masked clouds in a run share one copy of the mask.
+
+WordCloud still builds its own occupancy map from the mask for each cloud,
+as it writes into it while placing words.
+'''
+
+import os
+from functools import lru_cache
+
+from iprt import cache
+
+
+def prepare_mask(image_path, cache_dir='.iprt_cache/masks', size=None, threshold=128):
+    '''
+    threshold the image to 0 (draw) / 255 (keep clear) and save it, returning
+    the path of the .npy file. size is an optional (width, height).
+    '''
+    key = cache.combine(cache.hash_file(image_path), cache.hash_params({'size': size, 'threshold': threshold}))
+    npy_path = os.path.join(cache_dir, key + '.npy')
+    if os.path.exists(npy_path):
+        return npy_path
+
+    import numpy as np
+    from PIL import Image
+
+    image = Image.open(image_path).convert('L')
+    if size is not None:
+        image = image.resize(tuple(size))
+    mask = np.where(np.asarray(image) >= threshold, 255, 0).astype(np.uint8)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = npy_path + '.' + str(os.getpid()) + '.tmp.npy'
+    np.save(tmp_path, mask)
+    os.replace(tmp_path, npy_path)  # other processes never see a half written file
+    return npy_path
+
+
+@lru_cache(maxsize=None)
+def open_mask(npy_path):
+    '''the prepared mask, memory mapped read only, once per process'''
+    import numpy as np
+    return np.load(npy_path, mmap_mode='r')
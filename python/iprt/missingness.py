@@ -0,0 +1,72 @@
+'''
+Where the free text fields are left empty (the count_nulls cells of
+final_sprint1_nlp.py).
+
+Rather than copying the frame with replace(np.NaN, -1) and running a groupby
+per text column per dimension, the null matrix of the text columns is made
+once (respondents x columns) and every dimension is reduced against it with
+one sparse product: a (groups x respondents) indicator matrix built from the
+dimension's integer codes, times the null matrix, gives the null counts of
+every column in every group at once.
+'''
+
+
+def default_dimensions(df):
+    from iprt import survey
+
+    schema = survey.detect_schema(df) or survey.MIDLANDS
+    return [col for col in schema['groupings'] + ['children_number'] if col in df.columns]
+
+
+def default_text_columns(df):
+    from iprt import survey
+
+    schema = survey.detect_schema(df)
+    if schema is None:
+        return [col for col in df.columns if df[col].dtype == object]
+    return [col for col in [schema['thoughts'], schema['suggestions'], 'thoughts_facs'] if col in df.columns]
+
+
+def profile(df, text_cols=None, dims=None):
+    '''
+    tidy table of null counts and rates with columns
+    dimension, group, column, n, null_count, null_rate
+    The first rows (dimension 'All') are for the whole survey.
+    '''
+    import numpy as np
+    import pandas as pd
+    from scipy import sparse
+
+    text_cols = list(text_cols or default_text_columns(df))
+    dims = list(dims or default_dimensions(df))
+
+    nulls = np.column_stack([df[col].isnull().to_numpy() for col in text_cols]).astype(np.int64)
+    n_rows = nulls.shape[0]
+
+    frames = [_tidy('All', ['All'], np.array([n_rows]), nulls.sum(axis=0, keepdims=True), text_cols)]
+    for dim in dims:
+        codes, groups = pd.factorize(df[dim], sort=True)  # NaN is coded -1 and left out
+        valid = np.flatnonzero(codes >= 0)
+        indicator = sparse.csr_matrix((np.ones(len(valid), dtype=np.int64), (codes[valid], valid)),
+                                      shape=(len(groups), n_rows))
+        group_sizes = np.bincount(codes[valid], minlength=len(groups))
+        frames.append(_tidy(dim, groups, group_sizes, indicator.dot(nulls), text_cols))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _tidy(dim, groups, group_sizes, null_counts, text_cols):
+    import numpy as np
+    import pandas as pd
+
+    null_counts = np.asarray(null_counts)
+    k, t = null_counts.shape
+    n = np.repeat(group_sizes, t)
+    counts = null_counts.ravel()
+    return pd.DataFrame({
+        'dimension': dim,
+        'group': np.repeat(np.asarray(groups, dtype=object), t),
+        'column': np.tile(np.asarray(text_cols, dtype=object), k),
+        'n': n,
+        'null_count': counts,
+        'null_rate': np.where(n > 0, counts / np.maximum(n, 1), np.nan),
+    })
@@ -0,0 +1,269 @@
+'''
+Grouped n-gram tables and sentiment computed in a process pool.
+
+The rows of the survey are cut into contiguous shards - one per run of the
+same prison when shard_by is given, and at most rows_per_shard rows each.
+Every worker normalises its shard's responses once (stop words, stemming,
+spelling: the slow part), and for each grouping column and group returns a
+Segment: word, bigram and trigram counts of that group's words in the shard.
+
+Segments are joined with + in shard order. Joining is associative and gives
+exactly the counts make_tkn_text's token list would give, including the
+n-grams that cross from one shard to the next: each segment keeps its first
+and last two tokens, and the words before its first and after its last
+alphanumeric word stay untokenized until the neighbouring segment is known,
+since word_tokenize can split those differently in context. The tables are
+then ranked the same way grouped_ngrams ranks them, so
+
+    parallel_grouped_ngrams(df, 'thoughts_facs', ['Age'], shard_by='Prison')
+
+returns what text.grouped_ngrams(df, 'thoughts_facs', ['Age']) returns.
+That rests on word_tokenize splitting each alphanumeric word the same
+whatever its neighbours are. check compares the two on a frame for several
+shard sizes (iprt text-stats --check) and should be run again after an nltk
+upgrade.
+
+Workers correct spelling with the checker of this process (see
+text.set_spell_checker) whatever the multiprocessing start method:
+process_pool sets it in each worker as it starts, rather than relying on a
+forked copy of this process's state.
+'''
+
+from collections import Counter
+from functools import reduce
+
+
+class Counts(object):
+    '''word, bigram, skip-one bigram and trigram counts of a token list'''
+
+    def __init__(self, words=None, bigrams=None, skips=None, trigrams=None, first=(), last=()):
+        self.words = words if words is not None else Counter()  # in order of first use
+        self.bigrams = bigrams if bigrams is not None else Counter()
+        self.skips = skips if skips is not None else Counter()  # (w1, w3) of each trigram
+        self.trigrams = trigrams if trigrams is not None else Counter()
+        self.first = tuple(first)  # first two tokens
+        self.last = tuple(last)  # last two tokens
+
+    @classmethod
+    def from_tokens(cls, tokens):
+        tokens = list(tokens)
+        return cls(Counter(tokens), Counter(zip(tokens, tokens[1:])), Counter(zip(tokens, tokens[2:])),
+                   Counter(zip(tokens, tokens[1:], tokens[2:])), tokens[:2], tokens[-2:])
+
+    @classmethod
+    def from_words(cls, words):
+        '''counts of make_tkn_text's tokens for these normalised words'''
+        from nltk.tokenize import word_tokenize
+        return cls.from_tokens(word_tokenize(' '.join(words)) if words else [])
+
+    def __add__(self, other):
+        out = Counts(self.words + other.words, self.bigrams + other.bigrams, self.skips + other.skips,
+                     self.trigrams + other.trigrams, (self.first + other.first)[:2],
+                     (self.last + other.last)[-2:])
+        # the n-grams spanning the join
+        edge = self.last + other.first
+        k = len(self.last)
+        if 0 < k < len(edge):
+            out.bigrams[edge[k - 1:k + 1]] += 1
+        for i in range(max(k - 2, 0), k):
+            if i + 2 < len(edge):
+                out.trigrams[edge[i:i + 3]] += 1
+                out.skips[(edge[i], edge[i + 2])] += 1
+        return out
+
+    def bigram_finder(self):
+        from nltk.collocations import BigramCollocationFinder
+        from nltk.probability import FreqDist
+        return BigramCollocationFinder(FreqDist(self.words), FreqDist(self.bigrams))
+
+    def trigram_finder(self):
+        from nltk.collocations import TrigramCollocationFinder
+        from nltk.probability import FreqDist
+        return TrigramCollocationFinder(FreqDist(self.words), FreqDist(self.bigrams), FreqDist(self.skips),
+                                        FreqDist(self.trigrams))
+
+
+class Segment(object):
+    '''
+    the counts of a run of normalised words, up to its edges: head is the
+    words up to and including the first alphanumeric one (all of them if
+    there is none, with body None), tail the words after the last one
+    '''
+
+    def __init__(self, head=(), body=None, tail=()):
+        self.head = list(head)
+        self.body = body
+        self.tail = list(tail)
+
+    @classmethod
+    def from_words(cls, words):
+        clean = [i for i, w in enumerate(words) if w.isalnum()]
+        if not clean:
+            return cls(words)
+        first, last = clean[0], clean[-1]
+        return cls(words[:first + 1], Counts.from_words(words[first + 1:last + 1]), words[last + 1:])
+
+    def __add__(self, other):
+        if self.body is None and other.body is None:
+            return Segment(self.head + other.head)
+        if self.body is None:
+            return Segment(self.head + other.head, other.body, other.tail)
+        if other.body is None:
+            return Segment(self.head, self.body, self.tail + other.head)
+        middle = Counts.from_words(self.tail + other.head)
+        return Segment(self.head, self.body + middle + other.body, other.tail)
+
+    def counts(self):
+        if self.body is None:
+            return Counts.from_words(self.head)
+        return Counts.from_words(self.head) + self.body + Counts.from_words(self.tail)
+
+
+def shards(df, shard_by=None, rows_per_shard=None):
+    '''contiguous row slices of df, cut wherever shard_by changes value and every rows_per_shard rows'''
+    import numpy as np
+    import pandas as pd
+
+    cuts = {0, len(df)}
+    if shard_by is not None:
+        codes = pd.factorize(df[shard_by])[0]
+        cuts.update((np.flatnonzero(np.diff(codes)) + 1).tolist())
+    if rows_per_shard:
+        cuts.update(range(0, len(df), rows_per_shard))
+    cuts = sorted(cuts)
+    return [df.iloc[a:b] for a, b in zip(cuts, cuts[1:])]
+
+
+def map_shard(shard, column_name, group_cols, lexicon_dir=None):
+    '''
+    ({(grouping column, group): Segment}, sentiment of each response) for one
+    shard; the sentiment is None without a lexicon_dir
+    '''
+    import pandas as pd
+    from iprt import sentiment, text
+
+    responses = shard[column_name].dropna()
+    words = pd.Series([text.normalise(t) for t in responses], index=responses.index, dtype=object)
+    segments = {}
+    for col in group_cols:
+        for idx, grp in shard.loc[responses.index].groupby(col):
+            segments[(col, idx)] = Segment.from_words([w for ws in words[grp.index] for w in ws])
+    scores = None
+    if lexicon_dir is not None:
+        neg_words, pos_words = sentiment.lexicons(lexicon_dir)
+        scores = pd.Series([sentiment.score_tokens(sentiment.tokenize(t), neg_words, pos_words) for t in responses],
+                           index=responses.index, name='sentiment', dtype='int64')
+    return segments, scores
+
+
+def _map_shard(job):
+    return map_shard(*job)
+
+
+def process_pool(processes=None, start_method=None):
+    '''
+    a ProcessPoolExecutor whose workers use this process's spell checker;
+    start_method ('fork', 'spawn' or 'forkserver') defaults to the platform's
+    '''
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from iprt import text
+
+    context = multiprocessing.get_context(start_method) if start_method else None
+    return ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=text.set_spell_checker,
+                               initargs=text.spell_checker())
+
+
+def run_shards(df, column_name, group_cols, lexicon_dir=None, shard_by=None, rows_per_shard=None,
+               processes=None, start_method=None):
+    '''map_shard over the shards in a process pool (in this process for processes=1), in shard order'''
+    import os
+
+    if rows_per_shard is None and shard_by is None:
+        rows_per_shard = max(len(df) // (4 * (processes or os.cpu_count() or 1)), 1)
+    jobs = [(shard, column_name, list(group_cols), lexicon_dir)
+            for shard in shards(df, shard_by, rows_per_shard)]
+    if processes == 1:
+        return [_map_shard(job) for job in jobs]
+    with process_pool(processes, start_method) as pool:
+        return list(pool.map(_map_shard, jobs))
+
+
+def reduce_segments(results):
+    '''join each (grouping column, group)'s segments in shard order'''
+    parts = {}
+    for segments, _ in results:
+        for key, segment in segments.items():
+            parts.setdefault(key, []).append(segment)
+    return dict((key, reduce(lambda a, b: a + b, segs)) for key, segs in parts.items())
+
+
+def ngram_tables(df, group_cols, segments, filter_freq=3, no2return=10):
+    '''(common_words, bigrams_phrases, trigrams_phrases) like text.grouped_ngrams, from the joined segments'''
+    from nltk.collocations import BigramAssocMeasures, TrigramAssocMeasures
+
+    common_words = {}
+    bigrams_phrases = {}
+    trigrams_phrases = {}
+    for col in group_cols:
+        common_temp = {}
+        bigrams_temp = {}
+        trigrams_temp = {}
+        for idx in df.groupby(col).size().index:
+            counts = segments[(col, idx)].counts() if (col, idx) in segments else Counts()
+            common_temp[idx] = counts.words.most_common(no2return)
+            finder = counts.bigram_finder()
+            finder.apply_freq_filter(filter_freq)
+            bigrams_temp[idx] = finder.nbest(BigramAssocMeasures.pmi, no2return)
+            finder = counts.trigram_finder()
+            finder.apply_freq_filter(filter_freq)
+            trigrams_temp[idx] = finder.nbest(TrigramAssocMeasures.pmi, no2return)
+        common_words[col] = common_temp
+        bigrams_phrases[col] = bigrams_temp
+        trigrams_phrases[col] = trigrams_temp
+    return common_words, bigrams_phrases, trigrams_phrases
+
+
+def parallel_grouped_ngrams(df, column_name, group_cols, filter_freq=3, no2return=10, shard_by=None,
+                            rows_per_shard=None, processes=None, start_method=None):
+    '''text.grouped_ngrams, run shard by shard in a process pool'''
+    results = run_shards(df, column_name, group_cols, shard_by=shard_by, rows_per_shard=rows_per_shard,
+                         processes=processes, start_method=start_method)
+    return ngram_tables(df, group_cols, reduce_segments(results), filter_freq, no2return)
+
+
+def parallel_analysis(df, column_name, group_cols, lexicon_dir='.', filter_freq=3, no2return=10,
+                      shard_by=None, rows_per_shard=None, processes=None, start_method=None):
+    '''
+    (grouped n-gram tables, sentiment of each response) from one pass over
+    the shards; the sentiment matches sentiment.response_scores
+    '''
+    import pandas as pd
+
+    results = run_shards(df, column_name, group_cols, lexicon_dir=lexicon_dir, shard_by=shard_by,
+                         rows_per_shard=rows_per_shard, processes=processes, start_method=start_method)
+    scores = pd.concat([s for _, s in results], axis=0) if results else pd.Series(name='sentiment', dtype='int64')
+    return ngram_tables(df, group_cols, reduce_segments(results), filter_freq, no2return), scores
+
+
+def check(df, column_name, group_cols, rows_per_shard=(1, 7, 50, 500), shard_by=None, filter_freq=3,
+          no2return=10, processes=2, start_method='spawn'):
+    '''
+    [(rows_per_shard, table, grouping column, group)] of every table where
+    parallel_grouped_ngrams differs from text.grouped_ngrams; empty when the
+    join is exact. The shards run in spawned workers by default, so a spell
+    checker that does not reach them shows up as differences too.
+    '''
+    from iprt import text
+
+    serial = text.grouped_ngrams(df, column_name, group_cols, filter_freq, no2return)
+    differences = []
+    for size in rows_per_shard:
+        sharded = parallel_grouped_ngrams(df, column_name, group_cols, filter_freq, no2return, shard_by=shard_by,
+                                          rows_per_shard=size, processes=processes, start_method=start_method)
+        for name, expected, got in zip(['common_words', 'bigrams_phrases', 'trigrams_phrases'], serial, sharded):
+            for col in group_cols:
+                for group in sorted(set(expected[col]) | set(got[col]), key=str):
+                    if expected[col].get(group) != got[col].get(group):
+                        differences.append((size, name, col, group))
+    return differences
@@ -0,0 +1,227 @@
+'''
+A small stage runner for the text analysis, with every stage output cached on
+disk.
+
+Each stage is a function of the outputs of the stages it depends on plus
+some keyword parameters. A stage's cache key is the hash of its name,
+version, parameters and the *output* hashes of its dependencies, so:
+- changing a parameter such as filter_freq only recomputes that stage and
+  the stages downstream of it
+- if an upstream stage is recomputed but produces the same output, the
+  stages below it are still served from the cache
+- a stage whose key is already in the cache is never run, and its output is
+  only read from disk if a stage below it has to be recomputed
+
+Cache layout: <cache_dir>/<stage name>/<key>.pkl with a <key>.json holding
+the output hash.
+'''
+
+import json
+import os
+import pickle
+
+from iprt import cache, instrument
+
+
+class Stage(object):
+    def __init__(self, name, func, deps=(), params=None, version='1'):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.params = dict(params or {})
+        self.version = version
+
+
+class Pipeline(object):
+    def __init__(self, cache_dir='.iprt_cache'):
+        self.cache_dir = cache_dir
+        self.stages = {}
+        self.status = {}  # stage name -> 'cached' or 'computed' for the last run
+        self._outputs = {}  # (stage name, key) -> output already in memory
+
+    def add(self, name, func, deps=(), params=None, version='1'):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError('Stage ' + name + ' depends on unknown stage ' + dep)
+        self.stages[name] = Stage(name, func, deps, params, version)
+        return self
+
+    def set_params(self, name, **params):
+        self.stages[name].params.update(params)
+
+    def _order(self, targets):
+        # depth first topological order of the targets and their ancestors
+        order = []
+        seen = set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            order.append(name)
+
+        for name in targets:
+            visit(name)
+        return order
+
+    def _paths(self, name, key):
+        base = os.path.join(self.cache_dir, name, key)
+        return base + '.pkl', base + '.json'
+
+    def _key(self, stage, dep_hashes):
+        return cache.combine(stage.name, stage.version, cache.hash_params(stage.params),
+                             *[dep_hashes[d] for d in stage.deps])
+
+    def run(self, targets=None):
+        '''run (or fetch from the cache) the targets, returning {name: output}'''
+        if targets is None:
+            targets = list(self.stages)
+        order = self._order(targets)
+
+        keys = {}
+        output_hashes = {}
+        cached = set()
+        for name in order:
+            stage = self.stages[name]
+            keys[name] = self._key(stage, output_hashes)
+            _, meta_path = self._paths(name, keys[name])
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    output_hashes[name] = json.load(f)['output_hash']
+                cached.add(name)
+            else:
+                # the output hash is only known once the stage has run, so run
+                # it now (reading whatever it needs from the cache)
+                self._compute(name, keys, output_hashes)
+
+        self.status = dict((name, 'cached' if name in cached else 'computed') for name in order)
+        return dict((name, self._load(name, keys[name])) for name in targets)
+
+    def _compute(self, name, keys, output_hashes):
+        stage = self.stages[name]
+        inputs = [self._load(dep, keys[dep]) for dep in stage.deps]
+        with instrument.stage('stage:' + name):
+            output = stage.func(*inputs, **stage.params)
+        data = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+        output_hashes[name] = cache.hash_bytes(data)
+
+        pkl_path, meta_path = self._paths(name, keys[name])
+        os.makedirs(os.path.dirname(pkl_path), exist_ok=True)
+        with open(pkl_path, 'wb') as f:
+            f.write(data)
+        with open(meta_path, 'w') as f:
+            json.dump({'output_hash': output_hashes[name], 'params': stage.params}, f, default=str)
+        self._outputs[(name, keys[name])] = output
+
+    def _load(self, name, key):
+        if (name, key) not in self._outputs:
+            pkl_path, _ = self._paths(name, key)
+            with open(pkl_path, 'rb') as f:
+                self._outputs[(name, key)] = pickle.load(f)
+        return self._outputs[(name, key)]
+
+
+# the stages of the text analysis
+
+def load_stage(path, file_hash=None):
+    from iprt import survey
+    return survey.load_survey(path)
+
+
+def ngrams_stage(df, duplicates=None, column='thoughts_facs', group_cols=(), filter_freq=3, no2return=10):
+    '''with duplicates, only one response of each near duplicate cluster is counted'''
+    from iprt import text
+
+    if duplicates is not None:
+        df = df.drop(duplicates.index[~duplicates['representative'].values])
+    common_words, bigrams_phrases, trigrams_phrases = text.grouped_ngrams(
+        df, column, group_cols, filter_freq, no2return)
+    return {'common_words': common_words, 'bigrams_phrases': bigrams_phrases,
+            'trigrams_phrases': trigrams_phrases}
+
+
+def tables_stage(ngrams):
+    '''
+    one DataFrame per (table, grouping column); groups with fewer results are
+    padded, so a short list such as wing E's bigrams does not break it
+    '''
+    import pandas as pd
+
+    tables = {}
+    for table, by_col in ngrams.items():
+        for col, by_group in by_col.items():
+            tables[(table, col)] = pd.DataFrame(dict((idx, pd.Series(v)) for idx, v in by_group.items()))
+    return tables
+
+
+def sentiment_stage(df, duplicates=None, column=None, lexicon_dir='.', lexicon_hash=None):
+    '''with duplicates, each response is weighted by 1 / the size of its cluster'''
+    from iprt import sentiment
+
+    scores = sentiment.response_scores(df, column, lexicon_dir)
+    if duplicates is not None:
+        scores = scores * duplicates['weight'].reindex(scores.index).fillna(1.0)
+    return scores
+
+
+def analysis_pipeline(path, cache_dir='.iprt_cache', column='thoughts_facs', group_cols=None,
+                      filter_freq=3, no2return=10, sentiment_column=None, lexicon_dir='.',
+                      wordcloud_dir=None, mask_path=None, processes=None, dedup=False,
+                      dedup_threshold=0.8, topics=0, topic_method='lda'):
+    '''
+    load -> n-grams -> tables, load -> sentiment, load -> heatmap_cube (Midlands), if
+    wordcloud_dir is given load -> counts -> wordclouds, and with topics (a
+    number of topics, needs scikit-learn) load -> topics. With dedup, near
+    duplicate responses (see iprt.dedup) are collapsed for the n-grams and
+    down-weighted for the sentiment.
+    '''
+    from iprt import survey
+
+    schema = survey.read_schema(path)  # from the columns, not the file name
+    if group_cols is None:
+        group_cols = schema['groupings']
+    if sentiment_column is None:
+        sentiment_column = schema['thoughts']
+
+    pipe = Pipeline(cache_dir)
+    pipe.add('load', load_stage, params={'path': path, 'file_hash': cache.hash_file(path)})
+    ngram_deps = ['load']
+    if dedup:
+        from iprt import dedup as dedup_module
+        pipe.add('duplicates', dedup_module.duplicates_stage, deps=['load'],
+                 params={'column': column, 'threshold': dedup_threshold})
+        ngram_deps.append('duplicates')
+    pipe.add('ngrams', ngrams_stage, deps=ngram_deps,
+             params={'column': column, 'group_cols': list(group_cols),
+                     'filter_freq': filter_freq, 'no2return': no2return})
+    pipe.add('tables', tables_stage, deps=['ngrams'])
+    lexicon_files = [os.path.join(lexicon_dir, fn) for fn in ['negative-words.txt', 'positive-words.txt']]
+    if all(os.path.exists(fn) for fn in lexicon_files):
+        sentiment_deps = ['load']
+        if dedup:
+            pipe.add('sentiment_duplicates', dedup_module.duplicates_stage, deps=['load'],
+                     params={'column': sentiment_column, 'threshold': dedup_threshold})
+            sentiment_deps.append('sentiment_duplicates')
+        pipe.add('sentiment', sentiment_stage, deps=sentiment_deps,
+                 params={'column': sentiment_column, 'lexicon_dir': lexicon_dir,
+                         'lexicon_hash': cache.combine(*[cache.hash_file(fn) for fn in lexicon_files])})
+    if schema is survey.MIDLANDS:
+        # the binary facility and contact fields are only in the Midlands survey
+        from iprt import heatmaps
+        pipe.add('heatmap_cube', heatmaps.cube_stage, deps=['load'])
+    if topics:
+        from iprt import topics as topics_module
+        pipe.add('topics', topics_module.topics_stage, deps=['load'],
+                 params={'column': column, 'group_cols': list(group_cols), 'n_topics': topics,
+                         'method': topic_method, 'k': no2return})
+    if wordcloud_dir is not None:
+        from iprt import wordclouds
+        pipe.add('counts', wordclouds.count_stage, deps=['load'],
+                 params={'columns': [schema['thoughts'], schema['suggestions']], 'group_cols': list(group_cols)})
+        pipe.add('wordclouds', wordclouds.wordcloud_stage, deps=['counts'],
+                 params={'output_dir': wordcloud_dir, 'mask_path': mask_path, 'processes': processes,
+                         'mask_cache_dir': os.path.join(cache_dir, 'masks'),
+                         'mask_hash': cache.hash_file(mask_path) if mask_path else None})
+    return pipe
@@ -0,0 +1,240 @@
+'''
+Which of our functions the time goes to, and how much of that is nltk,
+pandas or autocorrect underneath them.
+
+Two profilers, both from the standard library:
+- Sampler (the default): a background thread looks at the running thread's
+  stack every interval seconds. Each sample is charged to the innermost iprt
+  function on the stack (make_tkn_text, bigrams_from_tokens, response_scores,
+  render_all, children_cis, ...) and to the package of the frame actually
+  running (iprt, nltk, pandas, autocorrect, numpy, stdlib, ...). The overhead
+  does not depend on how many calls are made.
+- cprofile: every call is traced with cProfile and the self time of each
+  function is summed by package. Exact call counts, but slower.
+
+Either way the profile is saved as JSON (with the iprt version, so profiles
+of two versions can be put side by side with compare) and, for the sampler,
+as collapsed stacks (.folded) for flamegraph tools.
+
+    with profiling.Sampler() as sampler:
+        pipe.run()
+    sampler.save('results/profile.json')
+'''
+
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+_IPRT_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP = {os.path.join(_IPRT_DIR, name) for name in ('profiling.py', 'instrument.py', 'cli.py', '__main__.py')}
+
+
+def package_of(filename):
+    '''the top level package a code file belongs to, 'stdlib' or 'builtins' otherwise'''
+    if not filename or filename.startswith('<') or filename == '~':
+        return 'builtins'
+    path = os.path.abspath(filename)
+    if path.startswith(_IPRT_DIR + os.sep):
+        return 'iprt'
+    parts = path.split(os.sep)
+    for marker in ('site-packages', 'dist-packages'):
+        if marker in parts[:-1]:
+            return os.path.splitext(parts[parts.index(marker) + 1])[0]
+    return 'stdlib'
+
+
+def function_name(code):
+    '''module.function of a code object, e.g. iprt.text.make_tkn_text'''
+    path = os.path.abspath(code.co_filename)
+    name = getattr(code, 'co_qualname', code.co_name)
+    if path.startswith(_IPRT_DIR + os.sep):
+        module = 'iprt.' + os.path.splitext(os.path.relpath(path, _IPRT_DIR))[0].replace(os.sep, '.')
+    else:
+        module = os.path.splitext(os.path.basename(path))[0]
+    return module + '.' + name
+
+
+def function_name_from(filename, name):
+    '''module.function of an iprt function from cProfile's (filename, name)'''
+    path = os.path.abspath(filename)
+    module = os.path.splitext(os.path.relpath(path, _IPRT_DIR))[0].replace(os.sep, '.')
+    return 'iprt.' + module + '.' + name
+
+
+def _version():
+    from iprt import __version__
+    return __version__
+
+
+class Sampler(object):
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self.by_function = collections.Counter()  # (iprt function or None, running package) -> samples
+        self.stacks = collections.Counter()  # collapsed stack -> samples
+        self.wall = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='iprt-sampler', daemon=True)
+        self.wall = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.wall = time.perf_counter() - self.wall
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self._sample(frame)
+
+    def _sample(self, frame):
+        leaf = package_of(frame.f_code.co_filename)
+        owner = None
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            if os.path.abspath(code.co_filename) not in _SKIP:
+                names.append(function_name(code))
+                if owner is None and package_of(code.co_filename) == 'iprt':
+                    owner = names[-1]
+            frame = frame.f_back
+        self.samples += 1
+        self.by_function[(owner, leaf)] += 1
+        self.stacks[';'.join(reversed(names))] += 1
+
+    def report(self):
+        seconds = self.wall / max(self.samples, 1)
+        by_package = collections.Counter()
+        functions = {}
+        for (owner, package), n in self.by_function.items():
+            by_package[package] += n
+            row = functions.setdefault(owner or '(outside iprt)', {'total_s': 0.0, 'by_package': {}})
+            row['total_s'] += n * seconds
+            row['by_package'][package] = row['by_package'].get(package, 0.0) + n * seconds
+        return {
+            'profiler': 'sampling',
+            'version': _version(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'wall_s': self.wall,
+            'samples': self.samples,
+            'by_package': dict((p, n * seconds) for p, n in by_package.most_common()),
+            'by_function': dict(sorted(functions.items(), key=lambda kv: -kv[1]['total_s'])),
+        }
+
+    def save(self, path):
+        '''the JSON report at path and the collapsed stacks as .folded next to it'''
+        _write_json(path, self.report())
+        with open(os.path.splitext(path)[0] + '.folded', 'w') as f:
+            f.write(''.join('%s %d\n' % (stack, n) for stack, n in self.stacks.most_common()))
+        return path
+
+
+class CProfiler(object):
+    def __enter__(self):
+        import cProfile
+
+        self.profile = cProfile.Profile()
+        self.wall = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        self.wall = time.perf_counter() - self.wall
+        return False
+
+    def report(self):
+        '''
+        self time by package, and for each iprt function its cumulative time
+        and the self time of what it calls directly, by package
+        '''
+        import pstats
+
+        stats = pstats.Stats(self.profile).stats
+        by_package = collections.Counter()
+        functions = {}
+        for (filename, line, name), (_, ncalls, tottime, cumtime, callers) in stats.items():
+            package = package_of(filename)
+            by_package[package] += tottime
+            for (caller_file, _, caller_name), (_, _, caller_tottime, _) in callers.items():
+                if package_of(caller_file) == 'iprt' and os.path.abspath(caller_file) not in _SKIP:
+                    caller = function_name_from(caller_file, caller_name)
+                    row = functions.setdefault(caller, {'total_s': 0.0, 'calls': 0, 'by_package': {}})
+                    row['by_package'][package] = row['by_package'].get(package, 0.0) + caller_tottime
+            if package == 'iprt' and os.path.abspath(filename) not in _SKIP:
+                row = functions.setdefault(function_name_from(filename, name),
+                                           {'total_s': 0.0, 'calls': 0, 'by_package': {}})
+                row['total_s'] = cumtime
+                row['calls'] = ncalls
+                row['by_package']['iprt'] = row['by_package'].get('iprt', 0.0) + tottime
+        return {
+            'profiler': 'cprofile',
+            'version': _version(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'wall_s': self.wall,
+            'by_package': dict(by_package.most_common()),
+            'by_function': dict(sorted(functions.items(), key=lambda kv: -kv[1]['total_s'])),
+        }
+
+    def save(self, path):
+        '''the JSON report at path and the raw profile as .pstats next to it (for snakeviz etc.)'''
+        _write_json(path, self.report())
+        self.profile.dump_stats(os.path.splitext(path)[0] + '.pstats')
+        return path
+
+
+def _write_json(path, report):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1)
+
+
+def profiler(mode='sampling', interval=0.005):
+    if mode == 'sampling':
+        return Sampler(interval)
+    if mode == 'cprofile':
+        return CProfiler()
+    raise ValueError('mode must be sampling or cprofile, not ' + str(mode))
+
+
+def summary(report, top=15):
+    '''printable tables of time by package and by iprt function'''
+    lines = ['%-40s %10s' % ('package', 'seconds')]
+    lines += ['%-40s %10.3f' % (p, s) for p, s in list(report['by_package'].items())[:top]]
+    lines += ['', '%-50s %10s  %s' % ('function', 'seconds', 'spent in')]
+    for name, row in list(report['by_function'].items())[:top]:
+        spent = sorted(row['by_package'].items(), key=lambda kv: -kv[1])[:3]
+        lines.append('%-50s %10.3f  %s' % (name[-50:], row['total_s'],
+                                           ', '.join('%s %.2f' % kv for kv in spent)))
+    return '\n'.join(lines)
+
+
+def compare(old, new, top=20):
+    '''
+    [(function, old seconds, new seconds)] of the functions whose time changed
+    most between two saved profiles (paths or loaded reports)
+    '''
+    if isinstance(old, str):
+        with open(old) as f:
+            old = json.load(f)
+    if isinstance(new, str):
+        with open(new) as f:
+            new = json.load(f)
+    names = set(old['by_function']) | set(new['by_function'])
+    rows = [(name, old['by_function'].get(name, {}).get('total_s', 0.0),
+             new['by_function'].get(name, {}).get('total_s', 0.0)) for name in names]
+    rows.sort(key=lambda r: -abs(r[2] - r[1]))
+    return rows[:top]
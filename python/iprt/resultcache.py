@@ -0,0 +1,165 @@
+'''
+The common_words, bigrams_phrases, trigrams_phrases and sentence_ngrams
+tables kept on disk between sessions.
+
+The tables of one grouping column are stored as one small Parquet file (a
+long table: table, group, rank, w1, w2, w3, count), named by the hash of
+- the text and grouping columns of the data
+- the column names, the tables, filter_freq and no2return
+- how the text was normalised: text.normalisation_config() (stop words,
+  stemmer, spell checker), or text.SENTENCE_CONFIG for sentence_ngrams
+so a notebook restart with the same data and parameters reads the tables
+back instead of tokenizing again, and any change gives a new file. Each hit
+touches its file; once the folder grows past max_bytes the least recently
+used files are deleted.
+
+    tables = cached_grouped_ngrams(df, 'thoughts_facs', ['Age', 'Sentence_length'])
+    sentence_ngrams = cached_sentence_ngrams(df, 'thoughts_facs', ['Age', 'Sentence_length'])
+
+needs pyarrow (pip install iprt[parquet]).
+'''
+
+import os
+
+from iprt import cache
+
+GROUPED_TABLES = ['common_words', 'bigrams_phrases', 'trigrams_phrases']
+TABLES = GROUPED_TABLES + ['sentence_ngrams']
+COUNTED = ['common_words', 'sentence_ngrams']  # entries are (ngram, count) rather than the ngram alone
+
+
+class ResultCache(object):
+    def __init__(self, cache_dir='.iprt_cache/results', max_bytes=256 * 2 ** 20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key(self, df, column_name, group_col, filter_freq, no2return, config=None, tables=GROUPED_TABLES):
+        from iprt import text
+
+        if config is None:
+            config = text.normalisation_config()
+        return cache.combine(cache.hash_frame(df[[column_name, group_col]]),
+                             cache.hash_params({'column': column_name, 'group_col': group_col,
+                                                'filter_freq': filter_freq, 'no2return': no2return,
+                                                'config': config, 'tables': list(tables)}))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.parquet')
+
+    def get(self, key):
+        '''{table: {group: list}} of one grouping column, or None'''
+        import pandas as pd
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # most recently used
+        return _from_long(pd.read_parquet(path))
+
+    def put(self, key, tables):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+        _to_long(tables).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        '''delete the least recently used files until the folder is under max_bytes'''
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.parquet'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= size
+
+
+def _to_long(tables):
+    '''one row per entry of {table: {group: list}}'''
+    import pandas as pd
+
+    rows = []
+    for table, by_group in tables.items():
+        for group, entries in by_group.items():
+            if not entries:
+                rows.append((table, group, -1, None, None, None, None))  # keeps the empty group
+            for rank, entry in enumerate(entries):
+                if table in COUNTED:
+                    ngram, count = entry
+                    words = [ngram] if table == 'common_words' else list(ngram)
+                    count = int(count)
+                else:
+                    words, count = list(entry), None
+                words += [None] * (3 - len(words))
+                rows.append((table, group, rank, words[0], words[1], words[2], count))
+    frame = pd.DataFrame(rows, columns=['table', 'group', 'rank', 'w1', 'w2', 'w3', 'count'])
+    frame['count'] = frame['count'].astype('Int64')
+    return frame
+
+
+def _from_long(frame):
+    tables = {}
+    for table, group, rank, w1, w2, w3, count in frame.itertuples(index=False, name=None):
+        entries = tables.setdefault(table, {}).setdefault(group, [])
+        if rank < 0:
+            continue
+        if table == 'common_words':
+            entries.append((w1, int(count)))
+        elif table == 'sentence_ngrams':
+            entries.append(((w1, w2), int(count)))
+        elif table == 'bigrams_phrases':
+            entries.append((w1, w2))
+        else:
+            entries.append((w1, w2, w3))
+    return tables
+
+
+def cached_grouped_ngrams(df, column_name, group_cols, filter_freq=3, no2return=10, result_cache=None,
+                          compute=None):
+    '''
+    text.grouped_ngrams, reading each grouping column's tables from the cache
+    when they are there. compute is what fills the misses, by default
+    text.grouped_ngrams (parallel.parallel_grouped_ngrams works too).
+    '''
+    from iprt import text
+
+    if result_cache is None:
+        result_cache = ResultCache()
+    if compute is None:
+        compute = text.grouped_ngrams
+    out = dict((table, {}) for table in GROUPED_TABLES)
+    for col in group_cols:
+        key = result_cache.key(df, column_name, col, filter_freq, no2return)
+        tables = result_cache.get(key)
+        if tables is None:
+            tables = dict((table, t[col]) for table, t in
+                          zip(GROUPED_TABLES, compute(df, column_name, [col], filter_freq, no2return)))
+            result_cache.put(key, tables)
+        for table in GROUPED_TABLES:
+            out[table][col] = tables.get(table, {})
+    return tuple(out[table] for table in GROUPED_TABLES)
+
+
+def cached_sentence_ngrams(df, column_name, group_cols, no2return=5, result_cache=None):
+    '''text.sentence_ngrams, reading each grouping column's table from the cache when it is there'''
+    from iprt import text
+
+    if result_cache is None:
+        result_cache = ResultCache()
+    out = {}
+    for col in group_cols:
+        key = result_cache.key(df, column_name, col, None, no2return, config=text.SENTENCE_CONFIG,
+                               tables=['sentence_ngrams'])
+        tables = result_cache.get(key)
+        if tables is None:
+            tables = {'sentence_ngrams': text.sentence_ngrams(df, column_name, [col], no2return)[col]}
+            result_cache.put(key, tables)
+        out[col] = tables.get('sentence_ngrams', {})
+    return out
@@ -0,0 +1,103 @@
+'''
+Word and n-gram counts for any grouping of the respondents, e.g. Age x
+Sentence_length, then Age, then Sentence_length.
+
+The counts are summed once from the token store to the finest grain, one
+row per combination of the grouping columns that occurs in the survey.
+Any coarser grouping set is then a sparse (groups x cells) indicator matrix
+times those rows - no groupby loop and no re-tokenizing per combination.
+
+    rollup = NgramRollup.from_frame(df, 'thoughts_facs', ['Age', 'Sentence_length', 'Children'], n=2)
+    rollup.top_k(['Age', 'Sentence_length'], 10)
+    rollup.top_k(['Age'], 10)
+'''
+
+
+class NgramRollup(object):
+    def __init__(self, store, keys, n=1, weights=None):
+        '''
+        store: a tokens.TokenStore
+        keys: DataFrame of the grouping columns, one row per response in store
+        weights: optional weight per response, e.g. dedup.find_duplicates()['weight']
+        to count each cluster of near duplicate responses once
+        '''
+        import numpy as np
+        from scipy import sparse
+
+        self.store = store
+        self.n = n
+        self.group_cols = list(keys.columns)
+        self.weighted = weights is not None
+        counts, self.ngrams = store.ngram_matrix(n)
+
+        # the finest grain: every combination of keys that occurs. Missing
+        # values are kept as their own cell here and dropped when rolling up.
+        keys = keys.reset_index(drop=True)
+        cell_of_doc = keys.groupby(self.group_cols, dropna=False, sort=True).ngroup().values
+        self.cells = keys.groupby(self.group_cols, dropna=False, sort=True).size().index.to_frame(index=False)
+        values = np.ones(len(cell_of_doc), dtype=np.int64) if weights is None else np.asarray(weights, dtype=float)
+        indicator = sparse.csr_matrix((values,
+                                       (cell_of_doc, np.arange(len(cell_of_doc)))),
+                                      shape=(len(self.cells), len(cell_of_doc)))
+        self.cell_counts = indicator.dot(counts).tocsr()
+        self.cell_responses = np.asarray(indicator.sum(axis=1)).ravel()
+        self._cache = {}
+
+    @classmethod
+    def from_frame(cls, df, column_name, group_cols, n=1, store=None, duplicates=None):
+        '''duplicates: optional dedup.find_duplicates() table to down-weight copies'''
+        from iprt.tokens import TokenStore
+
+        if store is None:
+            store = TokenStore.from_frame(df, column_name)
+        weights = None
+        if duplicates is not None:
+            weights = duplicates['weight'].reindex(store.doc_index).fillna(1.0).values
+        return cls(store, df.loc[store.doc_index, list(group_cols)], n=n, weights=weights)
+
+    def counts(self, group_cols=()):
+        '''
+        (groups, counts, responses) for a grouping set: a DataFrame of the
+        group values, a sparse groups x n-grams matrix and the number of
+        responses in each group. group_cols=() gives the overall counts.
+        With weights, counts and responses are weighted sums (floats).
+        '''
+        import numpy as np
+        import pandas as pd
+        from scipy import sparse
+
+        group_cols = tuple(group_cols)
+        if group_cols not in self._cache:
+            if group_cols:
+                cells = self.cells[list(group_cols)]
+                has_value = cells.notnull().all(axis=1).values
+                codes = np.full(len(cells), -1, dtype=np.int64)
+                codes[has_value] = cells[has_value].groupby(list(group_cols), sort=True).ngroup().values
+                groups = cells[has_value].groupby(list(group_cols), sort=True).size().index.to_frame(index=False)
+            else:
+                codes = np.zeros(len(self.cells), dtype=np.int64)
+                groups = pd.DataFrame(index=[0])
+            rows = np.flatnonzero(codes >= 0)
+            rollup = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (codes[rows], rows)),
+                                       shape=(len(groups), len(self.cells)))
+            self._cache[group_cols] = (groups, rollup.dot(self.cell_counts).tocsr(),
+                                       rollup.dot(self.cell_responses))
+        return self._cache[group_cols]
+
+    def top_k(self, group_cols=(), k=10):
+        '''
+        {group value: [(ngram, count), ...]}, the group value being a tuple for
+        more than one column and 'All' for the overall counts. The counts are
+        ints, or floats when the rollup was built with weights.
+        '''
+        import numpy as np
+
+        groups, counts, _ = self.counts(group_cols)
+        value = float if self.weighted else int
+        out = {}
+        for g, key in enumerate(groups.itertuples(index=False, name=None)):
+            row = counts.getrow(g)
+            order = np.lexsort((row.indices, -row.data))[:k]
+            label = 'All' if len(key) == 0 else key[0] if len(key) == 1 else key
+            out[label] = [(self.ngrams[row.indices[i]], value(row.data[i])) for i in order]
+        return out
@@ -0,0 +1,84 @@
+'''
+Lexicon based sentiment of the free text fields (neg_pos_inv from
+20171106-gpm-iprt_sprint_full_dataset.py).
+
+The lists of negative and positive words are from
+http://www.cs.uic.edu/~liub/FBS/sentiment-analysis.html and are read once per
+process into sets, rather than scanned as a DataFrame column for every word.
+'''
+
+import os
+from functools import lru_cache
+
+from iprt import instrument
+
+INV_WORDS = ['not', 'lack of', 'only', "can't", 'no', 'more']
+STOP_WORDS = ['.', ',', '"', "'", '?', '!', ':', ';', '(', ')', '[', ']', '{', '}', 'enhanced']
+
+LEXICON_HEADER_LINES = 36  # licence text at the top of the lexicon files
+
+
+@lru_cache(maxsize=None)
+def load_lexicon(path):
+    words = set()
+    with open(path, encoding='ISO-8859-1') as f:
+        for i, line in enumerate(f):
+            word = line.strip()
+            if i >= LEXICON_HEADER_LINES and word:
+                words.add(word)
+    return frozenset(words)
+
+
+def lexicons(lexicon_dir='.'):
+    '''(negative words, positive words)'''
+    return (load_lexicon(os.path.join(lexicon_dir, 'negative-words.txt')),
+            load_lexicon(os.path.join(lexicon_dir, 'positive-words.txt')))
+
+
+def score_tokens(word_list, neg_words, pos_words):
+    '''
+    +1 for a positive word, -1 for a negative word, and -1 for a positive word
+    preceded by an inverter ("not clean"); a positive word with an inverter
+    two words back scores 0.
+
+    This is not quite the notebook's neg_pos_inv, whose totals will differ:
+    there a typo (ppev = prev) leaves pprev always None, so an inverter two
+    words back never counts, and prev is carried over from the end of one
+    response to the start of the next. Here both are fixed and prev starts
+    again at every response.
+    '''
+    score = 0
+    prev = None
+    pprev = None
+    for word in word_list:
+        if word in pos_words:
+            if prev not in INV_WORDS:
+                score += 1
+            if prev in INV_WORDS or pprev in INV_WORDS:
+                score -= 1
+        if word in neg_words:
+            score -= 1
+        pprev = prev
+        prev = word
+    return score
+
+
+def tokenize(text):
+    from nltk.tokenize import wordpunct_tokenize
+    return [w.lower() for w in wordpunct_tokenize(text) if w.lower() not in STOP_WORDS]
+
+
+@instrument.instrumented('sentiment', count=len)
+def response_scores(df, column_name, lexicon_dir='.'):
+    '''sentiment of every non-empty response, indexed like df'''
+    import pandas as pd
+
+    neg_words, pos_words = lexicons(lexicon_dir)
+    text = df[column_name].dropna()
+    return pd.Series([score_tokens(tokenize(t), neg_words, pos_words) for t in text],
+                     index=text.index, name='sentiment')
+
+
+def neg_pos_inv(df, column_name, lexicon_dir='.'):
+    '''total sentiment of a column, a single number to compare prisons with'''
+    return int(response_scores(df, column_name, lexicon_dir).sum())
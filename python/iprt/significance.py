@@ -0,0 +1,113 @@
+'''
+Which words or n-grams are used significantly more (or less) by one group
+than by everyone else, e.g. kids_present against no_kids in
+Text_as_fn_of_children.py, without comparing two most_common lists by eye.
+
+For every grouping column, group and n-gram the 2 x 2 table
+
+                  this n-gram    every other n-gram
+    this group         a                 b
+    the rest           c                 d
+
+is tested with the log-likelihood ratio (G2) and Pearson's chi-square, one
+degree of freedom. All the tables come from the groups x n-grams count
+matrices of rollup.NgramRollup and are tested as whole arrays, and the
+p-values are corrected for the number of tests with Benjamini-Hochberg.
+'''
+
+
+def benjamini_hochberg(pvals):
+    '''false discovery rate adjusted p-values (q-values)'''
+    import numpy as np
+
+    pvals = np.asarray(pvals, dtype=float)
+    m = len(pvals)
+    if m == 0:
+        return pvals
+    order = np.argsort(pvals)
+    ranked = pvals[order] * m / np.arange(1, m + 1)
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+    q = np.empty(m)
+    q[order] = np.minimum(ranked, 1.0)
+    return q
+
+
+def contingency_tests(counts):
+    '''
+    (g2, chi2, expected) arrays, groups x n-grams, for the group against rest
+    table of every cell of a groups x n-grams count matrix
+    '''
+    import numpy as np
+    from scipy.special import xlogy
+
+    a = np.asarray(counts.todense() if hasattr(counts, 'todense') else counts, dtype=float)
+    term_total = a.sum(axis=0, keepdims=True)
+    group_total = a.sum(axis=1, keepdims=True)
+    n = a.sum()
+    b = group_total - a
+    c = term_total - a
+    d = n - group_total - c
+
+    observed = [a, b, c, d]
+    expected = [group_total * term_total / n,
+                group_total * (n - term_total) / n,
+                (n - group_total) * term_total / n,
+                (n - group_total) * (n - term_total) / n]
+
+    g2 = np.zeros_like(a)
+    chi2 = np.zeros_like(a)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for o, e in zip(observed, expected):
+            g2 += np.where(e > 0, xlogy(o, o / e), 0.0)
+            chi2 += np.where(e > 0, (o - e) ** 2 / e, 0.0)
+    return 2.0 * g2, chi2, expected[0]
+
+
+def compare(df, column_name, group_cols, n=1, min_count=3, rollup=None):
+    '''
+    ranked DataFrame of every (grouping column, group, n-gram) test with
+    columns group_col, group, ngram, count, expected, count_rest, g2, chi2,
+    p_value, q_value, direction ('over' or 'under' used in the group).
+    N-grams used fewer than min_count times in the whole survey are not tested.
+    '''
+    import numpy as np
+    import pandas as pd
+    from scipy.stats import chi2 as chi2_dist
+    from iprt.rollup import NgramRollup
+
+    group_cols = list(group_cols)
+    if rollup is None:
+        rollup = NgramRollup.from_frame(df, column_name, group_cols, n=n)
+    ngrams = np.empty(len(rollup.ngrams), dtype=object)
+    ngrams[:] = rollup.ngrams
+
+    frames = []
+    for col in group_cols:
+        groups, counts, _ = rollup.counts([col])
+        if len(groups) < 2:
+            continue
+        dense = np.asarray(counts.todense(), dtype=float)
+        keep = np.flatnonzero(dense.sum(axis=0) >= min_count)
+        dense = dense[:, keep]
+        g2, chi2, expected = contingency_tests(dense)
+        k, v = dense.shape
+        frames.append(pd.DataFrame({
+            'group_col': col,
+            'group': np.repeat(groups[col].values, v),
+            'ngram': np.tile(ngrams[keep], k),
+            'count': dense.ravel(),
+            'expected': expected.ravel(),
+            'count_rest': (dense.sum(axis=0, keepdims=True) - dense).ravel(),
+            'g2': g2.ravel(),
+            'chi2': chi2.ravel(),
+        }))
+
+    columns = ['group_col', 'group', 'ngram', 'count', 'expected', 'count_rest', 'g2', 'chi2',
+               'p_value', 'q_value', 'direction']
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    out = pd.concat(frames, ignore_index=True)
+    out['p_value'] = chi2_dist.sf(out['g2'].values, 1)
+    out['q_value'] = benjamini_hochberg(out['p_value'].values)
+    out['direction'] = np.where(out['count'].values >= out['expected'].values, 'over', 'under')
+    return out.sort_values(['q_value', 'g2'], ascending=[True, False]).reset_index(drop=True)[columns]
@@ -0,0 +1,276 @@
+'''
+Approximate n-gram counting in a fixed amount of memory.
+
+Exact Counter/FreqDist tables of trigrams grow with the text. For years of
+text from many prisons, ApproxNgramCounter keeps three fixed size summaries
+instead:
+- a count-min sketch: estimated count of any n-gram, never under the true
+  count, and over it by at most eps * N with probability 1 - delta
+  (eps = e / width, delta = exp(-depth), N = n-grams counted)
+- a space-saving table of the most frequent n-grams (heavy hitters); each
+  count is over the true count by at most the error stored with it, which is
+  at most N / capacity
+- a HyperLogLog estimate of the number of distinct n-grams, with relative
+  standard error 1.04 / sqrt(2 ** p)
+
+Updates are done in batches: the batch is aggregated with np.unique first,
+and the sketch and HyperLogLog updates are array operations.
+
+    counter = ApproxNgramCounter.from_budget(4 * 2 ** 20)
+    counter.update_keys(keys)
+    counter.top_k(10)  # [(ngram, estimate, error bound), ...]
+
+approx_top_ngrams runs these over a token store batch by batch, which is
+what iprt tokens --approx --memory MB prints.
+'''
+
+import hashlib
+import heapq
+import math
+
+_MASK64 = (1 << 64) - 1
+
+
+def splitmix64(keys, seed=0):
+    '''well mixed 64 bit hashes of an integer array'''
+    import numpy as np
+
+    with np.errstate(over='ignore'):
+        z = np.asarray(keys).astype(np.uint64) + np.uint64((0x9E3779B97F4A7C15 * (seed + 1)) & _MASK64)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def string_key(text):
+    '''a stable 64 bit integer key for a string (python's hash() changes per process)'''
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little') >> 1
+
+
+class CountMinSketch(object):
+    def __init__(self, width=2 ** 16, depth=4):
+        import numpy as np
+
+        self.width = int(width)
+        self.depth = int(depth)
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    @classmethod
+    def from_error(cls, eps=1e-4, delta=0.01):
+        return cls(width=math.ceil(math.e / eps), depth=math.ceil(math.log(1.0 / delta)))
+
+    def _columns(self, keys, row):
+        import numpy as np
+        return (splitmix64(keys, seed=row) % np.uint64(self.width)).astype(np.int64)
+
+    def update(self, keys, counts):
+        import numpy as np
+
+        for row in range(self.depth):
+            np.add.at(self.table[row], self._columns(keys, row), counts)
+        self.total += int(np.sum(counts))
+
+    def query(self, keys):
+        import numpy as np
+
+        estimates = np.full(len(keys), np.iinfo(np.int64).max, dtype=np.int64)
+        for row in range(self.depth):
+            estimates = np.minimum(estimates, self.table[row][self._columns(keys, row)])
+        return estimates
+
+    def error_bound(self):
+        '''(additive error, probability the error is within it)'''
+        return math.e / self.width * self.total, 1.0 - math.exp(-self.depth)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+
+class SpaceSaving(object):
+    '''the Metwally et al. space-saving summary of the capacity most frequent items'''
+
+    def __init__(self, capacity=1000):
+        self.capacity = int(capacity)
+        self.counts = {}
+        self.errors = {}
+        self._heap = []  # (count, item), with stale entries skipped on pop
+
+    def update(self, items, counts):
+        for item, count in zip(items, counts):
+            count = int(count)
+            if item in self.counts:
+                self.counts[item] += count
+            elif len(self.counts) < self.capacity:
+                self.counts[item] = count
+                self.errors[item] = 0
+            else:
+                # replace the smallest counter, inheriting its count as error
+                while True:
+                    smallest, victim = heapq.heappop(self._heap)
+                    if self.counts.get(victim) == smallest:
+                        break
+                del self.counts[victim]
+                del self.errors[victim]
+                self.counts[item] = smallest + count
+                self.errors[item] = smallest
+            heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, i) for i, c in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, k):
+        '''[(item, count, error)] of the k largest counters'''
+        best = heapq.nlargest(k, self.counts.items(), key=lambda kv: kv[1])
+        return [(item, count, self.errors[item]) for item, count in best]
+
+
+class HyperLogLog(object):
+    def __init__(self, p=14):
+        import numpy as np
+
+        self.p = int(p)
+        self.m = 1 << self.p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, keys):
+        import numpy as np
+
+        h = splitmix64(keys, seed=101)
+        index = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = h << np.uint64(self.p)
+        # rank = number of leading zeros of the remaining bits + 1
+        rank = np.full(len(h), 64 - self.p + 1, dtype=np.int64)
+        nonzero = rest != 0
+        rank[nonzero] = 64 - _bit_length(rest[nonzero]) + 1
+        np.maximum.at(self.registers, index, np.minimum(rank, 255).astype(np.uint8))
+
+    def count(self):
+        import numpy as np
+
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(2.0 ** -self.registers.astype(float))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / float(zeros))  # linear counting for small sets
+        return estimate
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def merge(self, other):
+        import numpy as np
+        self.registers = np.maximum(self.registers, other.registers)
+
+
+def _bit_length(x):
+    '''bit length of each uint64, by binary search on shifts'''
+    import numpy as np
+
+    x = x.copy()
+    length = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = x >= (np.uint64(1) << np.uint64(shift))
+        length[big] += shift
+        x[big] >>= np.uint64(shift)
+    return length + (x > 0)
+
+
+class ApproxNgramCounter(object):
+    def __init__(self, width=2 ** 16, depth=4, capacity=2000, p=14):
+        self.sketch = CountMinSketch(width, depth)
+        self.heavy = SpaceSaving(capacity)  # of integer keys
+        self.distinct = HyperLogLog(p)
+        self.items = {}  # key -> n-gram, for the keys in the heavy hitter table
+
+    @classmethod
+    def from_budget(cls, memory_bytes, depth=4, p=14):
+        '''
+        split a memory budget: HyperLogLog registers first, then 3/4 of the
+        rest to the sketch and 1/4 to the heavy hitter table (~200 bytes an entry)
+        '''
+        rest = max(memory_bytes - (1 << p), 1024)
+        width = max(int(rest * 0.75) // (8 * depth), 16)
+        capacity = max(int(rest * 0.25) // 200, 10)
+        return cls(width=width, depth=depth, capacity=capacity, p=p)
+
+    def update_keys(self, keys, items=None):
+        '''
+        count a batch of integer n-gram keys (e.g. TokenStore.ngram_keys). items,
+        if given, are what the heavy hitter table reports for each key
+        '''
+        import numpy as np
+
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) == 0:
+            return
+        unique, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        self.sketch.update(unique, counts)
+        self.distinct.update(unique)
+        self.heavy.update(unique.tolist(), counts)
+        if items is not None:
+            for key, i in zip(unique.tolist(), first):
+                if key in self.heavy.counts:
+                    self.items[key] = items[i]
+            if len(self.items) > 2 * self.heavy.capacity:
+                self.items = dict((key, item) for key, item in self.items.items() if key in self.heavy.counts)
+
+    def update_ngrams(self, ngrams):
+        '''count a batch of n-gram tuples, e.g. from nltk.ngrams over a stream of tokens'''
+        ngrams = list(ngrams)
+        self.update_keys([string_key(' '.join(g)) for g in ngrams], items=ngrams)
+
+    def top_k(self, k=10, decode=None):
+        '''
+        [(ngram, estimate, error bound)], the estimate being the smaller of the
+        sketch and heavy hitter counts, each of which can only over-count
+        '''
+        import numpy as np
+
+        candidates = self.heavy.top(k * 4)
+        if not candidates:
+            return []
+        sketched = self.sketch.query(np.asarray([key for key, _, _ in candidates], dtype=np.int64))
+        sketch_error, _ = self.sketch.error_bound()
+        rows = []
+        for (key, count, error), estimate in zip(candidates, sketched):
+            item = decode(key) if decode is not None else self.items.get(key, key)
+            rows.append((item, int(min(count, estimate)), min(error, sketch_error)))
+        rows.sort(key=lambda r: -r[1])
+        return rows[:k]
+
+    @property
+    def nbytes(self):
+        return self.sketch.nbytes + self.distinct.registers.nbytes + 200 * self.heavy.capacity
+
+
+def approx_top_ngrams(store, labels=None, n=2, k=10, memory_bytes=4 * 2 ** 20, batch_docs=10000):
+    '''
+    {group: (top k [(ngram, estimate, error bound)], distinct n-gram estimate)}
+    from a token store, one fixed size counter per group, fed batch_docs
+    responses at a time. labels is the group of each response (None for all,
+    reported as 'All'). Only one batch of n-gram keys is held at a time.
+    '''
+    import numpy as np
+
+    if labels is None:
+        labels = np.full(len(store), 'All', dtype=object)
+    labels = np.asarray(labels, dtype=object)
+    counters = {}
+    for start in range(0, len(store), batch_docs):
+        stop = min(start + batch_docs, len(store))
+        batch_doc_ids, batch_keys = store.slice(start, stop).ngram_keys(n)
+        batch_labels = labels[batch_doc_ids + start]
+        for group in set(batch_labels.tolist()):
+            if group is None or group != group:  # skip missing group values
+                continue
+            if group not in counters:
+                counters[group] = ApproxNgramCounter.from_budget(memory_bytes)
+            counters[group].update_keys(batch_keys[batch_labels == group])
+
+    def decode(key):
+        return store.decode(np.asarray([key], dtype=np.int64), n)[0]
+
+    return dict((group, (counter.top_k(k, decode=decode), counter.distinct.count()))
+                for group, counter in counters.items())
@@ -0,0 +1,197 @@
+'''
+Spelling correction with a precomputed symmetric delete index (SymSpell).
+
+autocorrect.spell generates every edit of a word on every call, and
+make_tkn_text calls it on every stemmed token. Here, every word of a
+frequency dictionary is stored under each string obtained by deleting up to
+max_distance characters from its first prefix_length characters. A lookup
+generates only the deletes of the (short) query prefix, finds the words
+sharing any of them with one np.searchsorted, and checks those few
+candidates with the real edit distance - roughly constant work per token.
+
+The index is a handful of numpy arrays saved in one .npz file, so it loads
+in milliseconds:
+
+    index = SpellIndex.build(autocorrect_frequencies())
+    index.save('spell_index.npz')
+    index = SpellIndex.load('spell_index.npz')
+    index.correct('visti')
+
+text.set_spell_checker(index) makes make_tkn_text use it, and
+compare_with_autocorrect checks it against today's corrections. A loaded
+index is named after the hash of its file, so cached results of two
+different indexes never share a key. A loaded index pickles as its path, so
+process pool workers open the file themselves rather than receive a copy of
+the arrays.
+'''
+
+import zlib
+from functools import lru_cache
+
+
+def autocorrect_frequencies():
+    '''the word counts autocorrect itself corrects with'''
+    try:
+        from autocorrect.nlp_parser import NLP_COUNTS  # autocorrect 0.x, which provides spell()
+        return dict(NLP_COUNTS)
+    except ImportError:
+        from autocorrect import Speller  # autocorrect >= 1.0
+        return dict(Speller(lang='en').nlp_data)
+
+
+def deletes(word, max_distance):
+    '''word and every string made by deleting up to max_distance characters from it'''
+    out = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = set(w[:i] + w[i + 1:] for w in frontier for i in range(len(w))) - out
+        out |= frontier
+    return out
+
+
+def _key(text):
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def edit_distance(a, b, max_distance):
+    '''
+    optimal string alignment distance (insert, delete, substitute, swap
+    neighbours), or max_distance + 1 once it is known to be larger
+    '''
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        # a later row can only improve on this one through a swap with the one before
+        if min(current) > max_distance and min(previous) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+class SpellIndex(object):
+    def __init__(self, words, counts, delete_keys, delete_words, max_distance=2, prefix_length=7):
+        self.words = words  # array of dictionary words
+        self.counts = counts  # their frequencies
+        self.delete_keys = delete_keys  # sorted crc32 of the deletes
+        self.delete_words = delete_words  # word id for each delete key
+        self.max_distance = int(max_distance)
+        self.prefix_length = int(prefix_length)
+        self.word_ids = dict((w, i) for i, w in enumerate(words.tolist()))
+        self.correct = lru_cache(maxsize=None)(self._correct)
+        self.path = None  # set when loaded from disk
+        self.name = None  # set by load, from the content hash of the file
+
+    def __call__(self, word):
+        return self.correct(word)
+
+    def __reduce_ex__(self, protocol):
+        if self.path is not None:
+            return open_index, (self.path,)
+        return super(SpellIndex, self).__reduce_ex__(protocol)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['correct']  # the cache of a bound method does not pickle
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.correct = lru_cache(maxsize=None)(self._correct)
+
+    @classmethod
+    def build(cls, frequencies, max_distance=2, prefix_length=7, min_count=1):
+        import numpy as np
+
+        items = sorted((w, c) for w, c in frequencies.items() if c >= min_count and w)
+        words = np.array([w for w, _ in items])
+        counts = np.array([c for _, c in items], dtype=np.int64)
+        keys = []
+        ids = []
+        for i, (word, _) in enumerate(items):
+            for d in deletes(word[:prefix_length], max_distance):
+                keys.append(_key(d))
+                ids.append(i)
+        keys = np.asarray(keys, dtype=np.uint32)
+        ids = np.asarray(ids, dtype=np.int32)
+        order = np.argsort(keys, kind='stable')
+        return cls(words, counts, keys[order], ids[order], max_distance, prefix_length)
+
+    def save(self, path):
+        import numpy as np
+        np.savez(path, words=self.words, counts=self.counts, delete_keys=self.delete_keys,
+                 delete_words=self.delete_words, settings=np.array([self.max_distance, self.prefix_length]))
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        from iprt import cache
+
+        with np.load(path) as data:
+            max_distance, prefix_length = data['settings'].tolist()
+            index = cls(data['words'], data['counts'], data['delete_keys'], data['delete_words'],
+                        max_distance, prefix_length)
+        index.path = path
+        index.name = 'symspell@' + cache.hash_file(path)[:16]
+        return index
+
+    def candidates(self, word):
+        '''ids of the dictionary words sharing a delete with word'''
+        import numpy as np
+
+        keys = np.fromiter((_key(d) for d in deletes(word[:self.prefix_length], self.max_distance)),
+                           dtype=np.uint32)
+        lo = np.searchsorted(self.delete_keys, keys, side='left')
+        hi = np.searchsorted(self.delete_keys, keys, side='right')
+        if not np.any(hi > lo):
+            return np.zeros(0, dtype=np.int32)
+        return np.unique(np.concatenate([self.delete_words[a:b] for a, b in zip(lo, hi) if b > a]))
+
+    def _correct(self, word):
+        '''
+        the word itself if it is in the dictionary, otherwise the most frequent
+        word at the smallest edit distance (up to max_distance), otherwise the word
+        '''
+        if word in self.word_ids or not word:
+            return word
+        best = None
+        best_rank = (self.max_distance + 1, 0)
+        for i in self.candidates(word):
+            candidate = self.words[i]
+            distance = edit_distance(word, candidate, self.max_distance)
+            rank = (distance, -int(self.counts[i]))
+            if distance <= self.max_distance and rank < best_rank:
+                best, best_rank = candidate, rank
+        return str(best) if best is not None else word
+
+
+@lru_cache(maxsize=None)
+def open_index(path):
+    '''SpellIndex.load, once per process'''
+    return SpellIndex.load(path)
+
+
+def compare_with_autocorrect(words, index):
+    '''
+    (agreement, differences): the share of words both correct the same way and
+    a DataFrame of the words where they differ
+    '''
+    import pandas as pd
+    from autocorrect import spell
+
+    words = sorted(set(words))
+    rows = []
+    for word in words:
+        expected = spell(word)
+        got = index.correct(word)
+        if expected != got:
+            rows.append({'word': word, 'autocorrect': expected, 'symspell': got})
+    agreement = 1.0 - len(rows) / float(max(len(words), 1))
+    return agreement, pd.DataFrame(rows, columns=['word', 'autocorrect', 'symspell'])
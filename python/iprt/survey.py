@@ -0,0 +1,75 @@
+'''
+Loading the survey files.
+
+Two layouts are used in this repo:
+- the Midlands survey (survey_results_clean.csv / .xlsx) with snake_case
+  columns such as prison_service_facilities_other_thoughts
+- the three prison workbook MID_LIM_WHT_Data.xlsx with columns such as
+  Other_thoughts and Suggestions_for_improvement
+'''
+
+import os
+
+from iprt import instrument
+
+MIDLANDS = {
+    'name': 'midlands',
+    'thoughts': 'prison_service_facilities_other_thoughts',
+    'suggestions': 'improve_contact_family_other_suggestions',
+    'groupings': ['sentence_length', 'age', 'prison_wing_main', 'children'],
+    'separator': '',  # the Midlands notebooks concatenate the fields directly
+}
+
+MID_LIM_WHT = {
+    'name': 'mid_lim_wht',
+    'thoughts': 'Other_thoughts',
+    'suggestions': 'Suggestions_for_improvement',
+    'groupings': ['Sentence_length', 'Age', 'Children'],
+    'separator': ' ',
+}
+
+SCHEMAS = [MIDLANDS, MID_LIM_WHT]
+
+
+def detect_schema(df):
+    '''return the schema dict whose free text columns are in df, or None'''
+    for schema in SCHEMAS:
+        if schema['thoughts'] in df.columns and schema['suggestions'] in df.columns:
+            return schema
+    return None
+
+
+def _read(path, nrows=None):
+    import pandas as pd
+
+    if os.path.splitext(path)[1].lower() == '.csv':
+        return pd.read_csv(path, na_values=['nan'], nrows=nrows)
+    book = pd.ExcelFile(path)
+    if 'Dataset' in book.sheet_names:
+        # the MID_LIM_WHT workbook, whatever the file is called
+        return pd.read_excel(book, sheet_name='Dataset', header=0, na_values=['Na'], nrows=nrows)
+    return pd.read_excel(book, nrows=nrows)
+
+
+def read_schema(path):
+    '''the schema of a survey file from its header row alone (MIDLANDS if unrecognised)'''
+    return detect_schema(_read(path, nrows=0)) or MIDLANDS
+
+
+@instrument.instrumented('load', count=len)
+def load_survey(path):
+    '''read a survey file and add the combined thoughts_facs free text column'''
+    df = _read(path)
+    if detect_schema(df) is not None:
+        add_thoughts_facs(df)
+    return df
+
+
+def add_thoughts_facs(df, schema=None):
+    '''combine the two free text fields the way the notebooks do'''
+    if schema is None:
+        schema = detect_schema(df)
+    if schema is None:
+        raise ValueError('Unrecognised survey layout, columns are: ' + ', '.join(map(str, df.columns)))
+    df['thoughts_facs'] = df[schema['thoughts']] + schema['separator'] + df[schema['suggestions']]
+    return df
@@ -0,0 +1,174 @@
+'''
+Synthetic surveys in the layout of the real files, for scale testing.
+
+midlands(n) and mid_lim_wht(n) return frames with the columns the loaders,
+the text analyses, the bootstrap and the breakdown scan read, at any number
+of rows and the same rows for the same seed:
+- free text drawn from a vocabulary with Zipf word frequencies (survey
+  words first, then a long tail of made up words), with varying response
+  lengths, empty responses and a few misspelt words
+- Likert answers (1 to 5) to the prison service questions, skewed by a
+  per respondent mood, and 1 / empty contact improvement ticks
+- child counts that add up: under 5 + 5 to 12 + 12 to 18 = boys + girls
+  under 18, and children_number = under 18 + adult children
+
+Everything is drawn as whole numpy arrays; only joining the words of each
+response is a python loop.
+
+    df = survey.add_thoughts_facs(synthetic.midlands(100000))
+'''
+
+# the common words of the responses, most frequent first
+SURVEY_WORDS = [
+    'the', 'to', 'more', 'and', 'visits', 'i', 'my', 'family', 'of', 'children', 'a', 'is', 'for', 'time',
+    'phone', 'be', 'should', 'kids', 'not', 'calls', 'visit', 'in', 'they', 'it', 'with', 'no', 'better',
+    'longer', 'staff', 'would', 'get', 'see', 'have', 'room', 'good', 'wife', 'partner', 'contact', 'help',
+    'need', 'video', 'clean', 'long', 'wait', 'waiting', 'letters', 'days', 'money', 'school',
+    'bad', 'dirty', 'enough', 'cold', 'food', 'toys', 'play', 'area', 'officers', 'searched', 'booking',
+    'week', 'hour', 'minutes', 'only', 'can\'t', 'cost', 'credit', 'mother', 'son', 'daughter', 'small',
+    'private', 'hug', 'touch', 'screen', 'closed', 'open', 'nice', 'friendly', 'rude', 'fair', 'unfair',
+]
+SYLLABLES = ['ba', 'ke', 'lo', 'mi', 'nu', 'ra', 'se', 'ti', 'vo', 'du', 'fe', 'ga', 'ho', 'pi', 'zu']
+PUNCTUATION = ['.', ',', '!', '?']
+
+AGES = ['18 - 24', '25 - 34', '35 - 44', '45 - 54', '55+']
+SENTENCE_LENGTHS = ['Less than 1 year', '1 - 3 years', '3 - 5 years', '5 - 10 years', '10+ years', 'Life']
+WINGS = ['A', 'B', 'C', 'D', 'E']
+PRISONS = ['Midlands', 'Limerick', 'Wheatfield']
+
+# prison service questions (names over 40 characters, see breakdown.prison_service_columns)
+FACILITIES_QUESTIONS = ['visiting_area_rating', 'waiting_area_rating', 'childrens_play_area_rating',
+                        'booking_visits_rating', 'phone_call_access_rating', 'staff_treatment_of_family_rating']
+CONTACT_OPTIONS = ['more_visits', 'longer_visits', 'phone_calls', 'video_calls', 'family_days', 'letters']
+
+
+def vocabulary(size=5000, seed=0):
+    '''SURVEY_WORDS then made up words of 2 to 4 syllables, size words in all'''
+    import numpy as np
+
+    rng = np.random.RandomState(seed)
+    words = list(SURVEY_WORDS[:size])
+    seen = set(words)
+    while len(words) < size:
+        n_syllables = rng.randint(2, 5, size - len(words))
+        for k in n_syllables:
+            word = ''.join(SYLLABLES[i] for i in rng.randint(0, len(SYLLABLES), k))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+    return words[:size]
+
+
+def responses(n, rng, vocab, zipf_s=1.1, mean_words=14, missing=0.4, typo_rate=0.01):
+    '''n free text responses (None for empty ones)'''
+    import numpy as np
+
+    vocab = np.asarray(vocab, dtype=object)
+    p = 1.0 / np.arange(1, len(vocab) + 1) ** zipf_s
+    lengths = np.maximum(rng.poisson(mean_words, n), 1)
+    lengths[rng.random_sample(n) < missing] = 0
+    words = vocab[rng.choice(len(vocab), size=int(lengths.sum()), p=p / p.sum())]
+
+    for i in np.flatnonzero(rng.random_sample(len(words)) < typo_rate):
+        word = words[i]
+        if len(word) > 3:
+            j = rng.randint(0, len(word) - 1)
+            words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+
+    ends = rng.choice(PUNCTUATION, size=n, p=[0.7, 0.1, 0.1, 0.1])
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    out = [None] * n
+    for i in np.flatnonzero(lengths):
+        out[i] = ' '.join(words[offsets[i]:offsets[i + 1]]) + ends[i]
+    return out
+
+
+def likert(n, rng, columns, mood=None):
+    '''{column: answers 1 to 5}, each respondent's answers shifted by their mood'''
+    import numpy as np
+
+    if mood is None:
+        mood = rng.normal(0, 1, n)
+    return dict((col, np.clip(np.rint(3 + mood + rng.normal(0, 0.8, n)), 1, 5).astype(np.int64))
+                for col in columns)
+
+
+def child_counts(n, rng, none=0.45):
+    has = rng.random_sample(n) >= none
+    under_5 = rng.poisson(0.7, n) * has
+    aged_5_12 = rng.poisson(0.8, n) * has
+    aged_12_18 = rng.poisson(0.6, n) * has
+    adult = rng.poisson(0.3, n) * has
+    under_18 = under_5 + aged_5_12 + aged_12_18
+    boys = rng.binomial(under_18, 0.5)
+    return {
+        'children_number': under_18 + adult,
+        'children_aged_under_5': under_5,
+        'children_aged_5_12': aged_5_12,
+        'boys_under_18': boys,
+        'girls_under_18': under_18 - boys,
+        'adult_children': adult,
+    }
+
+
+def _categories(n, rng, values, weights=None):
+    import numpy as np
+
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float) / np.sum(weights)
+    return rng.choice(np.asarray(values, dtype=object), size=n, p=weights)
+
+
+def midlands(n, seed=0, vocab_size=5000, start='2017-06-01', days=60):
+    '''a frame in the layout of survey_results_clean.csv'''
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.RandomState(seed)
+    vocab = vocabulary(vocab_size, seed)
+    mood = rng.normal(0, 1, n)
+    df = pd.DataFrame({
+        'survey_time': pd.Timestamp(start) + pd.to_timedelta(rng.randint(0, days * 24 * 3600, n), unit='s'),
+        'age': _categories(n, rng, AGES, [25, 30, 22, 15, 8]),
+        'sentence_length': _categories(n, rng, SENTENCE_LENGTHS, [10, 25, 25, 20, 15, 5]),
+        'prison_wing_main': _categories(n, rng, WINGS),
+    })
+    for col, values in child_counts(n, rng).items():
+        df[col] = values
+    df['children'] = np.where(df['children_number'] > 0, 'Yes', 'No')
+    for col, values in likert(n, rng, ['prison_service_facilities_' + q for q in FACILITIES_QUESTIONS],
+                              mood).items():
+        df[col] = values
+    for option in CONTACT_OPTIONS:
+        df['improve_contact_family_' + option] = np.where(rng.random_sample(n) < 0.3, 1.0, np.nan)
+    df['prison_service_facilities_other_thoughts'] = responses(n, rng, vocab)
+    df['improve_contact_family_other_suggestions'] = responses(n, rng, vocab, mean_words=10, missing=0.5)
+    return df
+
+
+def mid_lim_wht(n, seed=0, vocab_size=5000):
+    '''a frame in the layout of the Dataset sheet of MID_LIM_WHT_Data.xlsx, rows grouped by prison'''
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.RandomState(seed)
+    vocab = vocabulary(vocab_size, seed)
+    prisons = np.sort(rng.choice(len(PRISONS), size=n, p=[0.4, 0.25, 0.35]))
+    df = pd.DataFrame({
+        'Prison': np.asarray(PRISONS, dtype=object)[prisons],
+        'Age': _categories(n, rng, AGES, [25, 30, 22, 15, 8]),
+        'Sentence_length': _categories(n, rng, SENTENCE_LENGTHS, [10, 25, 25, 20, 15, 5]),
+        'Children': _categories(n, rng, ['Yes', 'No'], [55, 45]),
+    })
+    df['Other_thoughts'] = responses(n, rng, vocab)
+    df['Suggestions_for_improvement'] = responses(n, rng, vocab, mean_words=10, missing=0.5)
+    return df
+
+
+def write(df, path):
+    '''save a synthetic frame where load_survey can read it (.csv, or .xlsx with the Dataset sheet)'''
+    if path.lower().endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, sheet_name='Dataset', index=False)
+    return path
@@ -0,0 +1,222 @@
+'''
+Text helpers shared by the NLTK analyses.
+
+These are make_tkn_text, Ten_most_common, Field_bigrams, Field_trigrams and
+the unweighted sentence_ngrams bigrams from the notebooks in NLTK_code. The
+stopword corpus, the stemmers and the spell checker are loaded once per
+process rather than on every call, and the grouped tables tokenize each
+group once instead of once per table.
+'''
+
+from collections import Counter
+from functools import lru_cache
+
+from iprt import instrument
+
+# characters the notebooks add on top of the nltk stopword list
+PUNCTUATION = ['.', ',', '"', "'", '?', '!', ':', ';', '(', ')', '[', ']', '{', '}']
+
+
+@lru_cache(maxsize=None)
+def stop_words():
+    '''english nltk stopwords plus punctuation, read from the corpus once'''
+    from nltk.corpus import stopwords
+    words = set(stopwords.words('english'))
+    words.update(PUNCTUATION)
+    return frozenset(words)
+
+
+@lru_cache(maxsize=None)
+def stemmer():
+    from nltk.stem.snowball import SnowballStemmer
+    return SnowballStemmer('english')
+
+
+@lru_cache(maxsize=None)
+def porter_stemmer():
+    from nltk.stem import PorterStemmer
+    return PorterStemmer()
+
+
+@lru_cache(maxsize=None)
+def sentence_stop_words():
+    '''english nltk stopwords plus string.punctuation, the stop_list of stem_all'''
+    import string
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english') + list(string.punctuation))
+
+
+# what sentence_bigrams does to the text, for keying cached results (no spell correction)
+SENTENCE_CONFIG = {'stop_words': 'nltk english + string.punctuation', 'stemmer': 'porter'}
+
+
+_spell_checker = None  # None for autocorrect.spell
+_spell_checker_name = 'autocorrect'
+
+
+def set_spell_checker(checker=None, name=None):
+    '''
+    correct words with checker (a function word -> word, e.g. a
+    spelling.SpellIndex) instead of autocorrect.spell; None goes back to
+    autocorrect. name identifies the checker in cache keys (see
+    normalisation_config) and must tell different checkers apart; a loaded
+    SpellIndex has one already.
+    '''
+    global _spell_checker, _spell_checker_name
+    if checker is not None and name is None:
+        name = getattr(checker, 'name', None)
+        if name is None:
+            raise ValueError('set_spell_checker needs a name for the checker, to key cached results')
+    _spell_checker = checker
+    _spell_checker_name = 'autocorrect' if checker is None else name
+    spell.cache_clear()
+
+
+def spell_checker():
+    '''
+    (checker, name) as given to set_spell_checker, for passing on to worker
+    processes, which start with autocorrect unless forked from this one
+    '''
+    return _spell_checker, _spell_checker_name
+
+
+def normalisation_config():
+    '''what normalise does to the text, for keying cached results'''
+    return {'stop_words': 'nltk english + punctuation', 'stemmer': 'snowball english',
+            'spell': _spell_checker_name}
+
+
+@lru_cache(maxsize=None)
+def spell(word):
+    '''autocorrect.spell, memoised - the survey text repeats the same stems a lot'''
+    if _spell_checker is not None:
+        return _spell_checker(word)
+    from autocorrect import spell as autocorrect_spell
+    return autocorrect_spell(word)
+
+
+def normalise(text):
+    '''
+    tokenize a string, drop stop words and punctuation, stem and spell correct
+    (the word_list step of make_tkn_text)
+    '''
+    from nltk.tokenize import wordpunct_tokenize
+    stop = stop_words()
+    stem = stemmer().stem
+    if instrument.active() is None:
+        return [spell(stem(word.lower())) for word in wordpunct_tokenize(text) if word.lower() not in stop]
+    # the same, in three timed passes
+    with instrument.stage('tokenize') as span:
+        words = [word.lower() for word in wordpunct_tokenize(text)]
+        words = [word for word in words if word not in stop]
+        span.items = len(words)
+    with instrument.stage('stem', items=len(words)):
+        words = [stem(word) for word in words]
+    with instrument.stage('spell', items=len(words)):
+        return [spell(word) for word in words]
+
+
+@instrument.instrumented('make_tkn_text', count=len)
+def make_tkn_text(df, column_name):
+    '''all the text in a column as one normalised list of tokens'''
+    from nltk.tokenize import word_tokenize
+    word_list = normalise(' '.join(df[column_name].dropna()))
+    return word_tokenize(' '.join(word_list))
+
+
+@instrument.instrumented('response_tokens', count=len)
+def response_tokens(df, column_name):
+    '''
+    make_tkn_text applied to each response separately, as a Series of token
+    lists indexed like the non-empty rows of df. Counts for any grouping can
+    then be summed from these without tokenizing the text again.
+    '''
+    import pandas as pd
+    from nltk.tokenize import word_tokenize
+
+    text = df[column_name].dropna()
+    return pd.Series([word_tokenize(' '.join(normalise(t))) for t in text], index=text.index,
+                     name=column_name, dtype=object)
+
+
+def Ten_most_common(table, column_name):
+    return Counter(make_tkn_text(table, column_name)).most_common(10)
+
+
+@instrument.instrumented('collocations')
+def bigrams_from_tokens(tokens, filter_freq, no2return):
+    '''top bigrams by PMI, ignoring those seen fewer than filter_freq times'''
+    from nltk.collocations import BigramAssocMeasures, BigramCollocationFinder
+    finder = BigramCollocationFinder.from_words(tokens)
+    finder.apply_freq_filter(filter_freq)
+    return finder.nbest(BigramAssocMeasures.pmi, no2return)
+
+
+@instrument.instrumented('collocations')
+def trigrams_from_tokens(tokens, filter_freq, no2return):
+    '''top trigrams by PMI, ignoring those seen fewer than filter_freq times'''
+    from nltk.collocations import TrigramAssocMeasures, TrigramCollocationFinder
+    finder = TrigramCollocationFinder.from_words(tokens)
+    finder.apply_freq_filter(filter_freq)
+    return finder.nbest(TrigramAssocMeasures.pmi, no2return)
+
+
+def Field_bigrams(table, column_name, filter_freq, no2return):
+    return bigrams_from_tokens(make_tkn_text(table, column_name), filter_freq, no2return)
+
+
+def Field_trigrams(table, column_name, filter_freq, no2return):
+    return trigrams_from_tokens(make_tkn_text(table, column_name), filter_freq, no2return)
+
+
+def grouped_ngrams(df, column_name, group_cols, filter_freq=3, no2return=10):
+    '''
+    the "weighted bigrams and common words" cell of Unified_NLTK_code.py
+    returns (common_words, bigrams_phrases, trigrams_phrases), each a dict of
+    grouping column -> group value -> list
+    '''
+    common_words = {}
+    bigrams_phrases = {}
+    trigrams_phrases = {}
+    for col in group_cols:
+        common_temp = {}
+        bigrams_temp = {}
+        trigrams_temp = {}
+        for idx, grp in df.groupby(col):
+            field_Tkn = make_tkn_text(grp, column_name)
+            with instrument.stage('count', items=len(field_Tkn)):
+                common_temp[idx] = Counter(field_Tkn).most_common(no2return)
+            bigrams_temp[idx] = bigrams_from_tokens(field_Tkn, filter_freq, no2return)
+            trigrams_temp[idx] = trigrams_from_tokens(field_Tkn, filter_freq, no2return)
+        common_words[col] = common_temp
+        bigrams_phrases[col] = bigrams_temp
+        trigrams_phrases[col] = trigrams_temp
+    return common_words, bigrams_phrases, trigrams_phrases
+
+
+def stem_all(text):
+    '''
+    the tokens of a string as stem_all of the notebooks gives them: lower
+    case, stop words dropped, Porter stemmed, not spell corrected
+    '''
+    from nltk.tokenize import word_tokenize
+    stop = sentence_stop_words()
+    stem = porter_stemmer().stem
+    words = [token.lower() for token in word_tokenize(text)]
+    return [stem(word) for word in words if word not in stop]
+
+
+@instrument.instrumented('sentence_bigrams')
+def sentence_bigrams(df, column_name, no2return=5):
+    '''the most common bigrams of a column after stem_all'''
+    from nltk.util import ngrams
+    return Counter(ngrams(stem_all(' '.join(df[column_name].dropna())), 2)).most_common(no2return)
+
+
+def sentence_ngrams(df, column_name, group_cols, no2return=5):
+    '''
+    the "unweighted bigrams" cell of Unified_NLTK_code.py, a dict of grouping
+    column -> group value -> [(bigram, count), ...]
+    '''
+    return dict((col, dict((idx, sentence_bigrams(grp, column_name, no2return)) for idx, grp in df.groupby(col)))
+                for col in group_cols)
@@ -0,0 +1,122 @@
+'''
+N-gram counts and sentiment over time (the "by_day" cell of
+final_sprint1_nlp.py).
+
+The per-response n-gram counts come from a token store and the
+per-response sentiment from sentiment.response_scores, both computed once.
+from_frame tokenizes the responses the way by_day did, with stem_all
+(Porter stemmed, no spell correction), rather than with make_tkn_text's
+normalisation. Unlike by_day, bigrams do not run from one response into the
+next, so a day's counts can be slightly lower.
+Any bucket size is then a sparse (buckets x responses) indicator matrix
+times those counts, and a rolling window is a banded (buckets x buckets)
+matrix times the bucket counts, so changing the bucket size or the window
+does not touch the text again.
+
+    series = TimeBuckets.from_frame(df, 'thoughts_facs', 'survey_time', n=2)
+    series.top_k('D', 5)          # by_day
+    series.rolling('D', window=7) # seven day rolling sums
+'''
+
+
+class TimeBuckets(object):
+    def __init__(self, store, timestamps, n=2, scores=None):
+        '''
+        store: a tokens.TokenStore
+        timestamps: survey time of each response, aligned with store.doc_index
+        scores: optional per-response sentiment, also aligned with store.doc_index
+        '''
+        import numpy as np
+        import pandas as pd
+
+        self.store = store
+        self.n = n
+        self.counts, self.ngrams = store.ngram_matrix(n)
+        self.timestamps = pd.DatetimeIndex(timestamps)
+        self.scores = None if scores is None else np.asarray(scores, dtype=float)
+
+    @classmethod
+    def from_frame(cls, df, column_name, time_column='survey_time', n=2, store=None, scores=None):
+        '''store: a TokenStore to count instead, e.g. one normalised like make_tkn_text'''
+        import pandas as pd
+        from iprt import text
+        from iprt.tokens import TokenStore
+
+        if store is None:
+            store = TokenStore.from_frame(df, column_name, tokenize=text.stem_all)
+        timestamps = pd.to_datetime(df.loc[store.doc_index, time_column])
+        if scores is not None:
+            scores = scores.reindex(store.doc_index).fillna(0).values
+        return cls(store, timestamps, n=n, scores=scores)
+
+    def _indicator(self, freq):
+        import numpy as np
+        import pandas as pd
+        from scipy import sparse
+
+        has_time = ~self.timestamps.isna()
+        periods = self.timestamps[has_time].to_period(freq)
+        # every bucket between the first and last response, including empty ones
+        buckets = pd.period_range(periods.min(), periods.max(), freq=freq)
+        rows = buckets.get_indexer(periods)
+        cols = np.flatnonzero(has_time)
+        indicator = sparse.csr_matrix((np.ones(len(cols), dtype=np.int64), (rows, cols)),
+                                      shape=(len(buckets), len(self.timestamps)))
+        return buckets.to_timestamp(), indicator
+
+    def bucket(self, freq='D'):
+        '''
+        (buckets, counts, responses, sentiment): the start of each bucket, a
+        sparse buckets x n-grams count matrix, the number of responses and the
+        summed sentiment per bucket (None without scores)
+        '''
+        import numpy as np
+
+        buckets, indicator = self._indicator(freq)
+        counts = indicator.dot(self.counts).tocsr()
+        responses = np.asarray(indicator.sum(axis=1)).ravel()
+        sentiment = None if self.scores is None else indicator.dot(self.scores)
+        return buckets, counts, responses, sentiment
+
+    def rolling(self, freq='D', window=7):
+        '''bucket() summed over each bucket and the window - 1 buckets before it'''
+        import numpy as np
+        from scipy import sparse
+
+        buckets, counts, responses, sentiment = self.bucket(freq)
+        k = len(buckets)
+        band = sparse.diags([np.ones(k - lag) for lag in range(min(window, k))],
+                           [-lag for lag in range(min(window, k))], shape=(k, k), format='csr', dtype=np.int64)
+        return (buckets, band.dot(counts).tocsr(), band.dot(responses),
+                None if sentiment is None else band.dot(sentiment))
+
+    def top_k(self, freq='D', k=5, window=None):
+        '''{bucket start: [(ngram, count), ...]} for every bucket with any text'''
+        import numpy as np
+
+        if window is None:
+            buckets, counts, _, _ = self.bucket(freq)
+        else:
+            buckets, counts, _, _ = self.rolling(freq, window)
+        out = {}
+        for b in range(len(buckets)):
+            row = counts.getrow(b)
+            if row.nnz == 0:
+                continue
+            # most common first, ties broken by n-gram order
+            order = np.lexsort((row.indices, -row.data))[:k]
+            out[buckets[b]] = [(self.ngrams[row.indices[i]], int(row.data[i])) for i in order]
+        return out
+
+    def frame(self, freq='D', window=None):
+        '''responses and sentiment per bucket as a DataFrame'''
+        import pandas as pd
+
+        if window is None:
+            buckets, _, responses, sentiment = self.bucket(freq)
+        else:
+            buckets, _, responses, sentiment = self.rolling(freq, window)
+        out = pd.DataFrame({'responses': responses}, index=buckets)
+        if sentiment is not None:
+            out['sentiment'] = sentiment
+        return out
@@ -0,0 +1,237 @@
+'''
+The tokenized free text of a survey, one entry per response.
+
+Tokens are stored as integer ids into a vocabulary, all responses end to end
+in one array, with offsets marking where each response starts:
+
+    tokens of response i = vocab[ids[offsets[i]:offsets[i + 1]]]
+
+Counting words or n-grams for any subset or grouping of responses is then
+integer work on these arrays (see ngram_matrix) rather than a new pass of
+tokenizing, stemming and spell checking.
+
+A store can be saved as a folder of .npy files (the arrays, the vocabulary
+and any n-gram count matrices) and opened memory mapped with open_store, so
+worker processes and later runs read the same pages instead of each holding
+a copy. A store opened from disk pickles as its path.
+'''
+
+import json
+import os
+from collections import OrderedDict
+from functools import lru_cache
+
+
+class TokenStore(object):
+    def __init__(self, ids, offsets, vocab, doc_index, column=None):
+        self.ids = ids  # int32 token ids, all responses concatenated
+        self.offsets = offsets  # int64, len(doc_index) + 1
+        self.vocab = list(vocab)
+        self.doc_index = doc_index  # index labels of the responses in the survey frame
+        self.column = column
+        self._term_ids = None
+        self._ngrams = {}
+        self.path = None  # set when opened from disk
+
+    def __reduce_ex__(self, protocol):
+        if self.path is not None:
+            return open_store, (self.path,)
+        return super(TokenStore, self).__reduce_ex__(protocol)
+
+    @classmethod
+    def from_token_lists(cls, token_lists, doc_index, column=None):
+        import numpy as np
+
+        term_ids = OrderedDict()
+        ids = []
+        offsets = [0]
+        for tokens in token_lists:
+            for token in tokens:
+                ids.append(term_ids.setdefault(token, len(term_ids)))
+            offsets.append(len(ids))
+        return cls(np.asarray(ids, dtype=np.int32), np.asarray(offsets, dtype=np.int64),
+                   list(term_ids), np.asarray(doc_index), column)
+
+    @classmethod
+    def from_frame(cls, df, column_name, tokenize=None):
+        '''
+        tokenize each non-empty response of a column with text.response_tokens,
+        or with tokenize (a function of one string, e.g. text.stem_all)
+        '''
+        from iprt import text
+        if tokenize is not None:
+            responses = df[column_name].dropna()
+            return cls.from_token_lists([tokenize(t) for t in responses], responses.index, column_name)
+        tokens = text.response_tokens(df, column_name)
+        return cls.from_token_lists(tokens.tolist(), tokens.index, column_name)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def term_ids(self):
+        if self._term_ids is None:
+            self._term_ids = dict((term, i) for i, term in enumerate(self.vocab))
+        return self._term_ids
+
+    def doc_lengths(self):
+        import numpy as np
+        return np.diff(self.offsets)
+
+    def doc_of_position(self):
+        '''the response each position in ids belongs to'''
+        import numpy as np
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.doc_lengths())
+
+    def tokens(self, i):
+        return [self.vocab[t] for t in self.ids[self.offsets[i]:self.offsets[i + 1]]]
+
+    def slice(self, start, stop):
+        '''responses start to stop as a store over the same ids (a view, not a copy, when memory mapped)'''
+        offsets = self.offsets[start:stop + 1]
+        return TokenStore(self.ids[offsets[0]:offsets[-1]], offsets - offsets[0], self.vocab,
+                          self.doc_index[start:stop], self.column)
+
+    def ngram_matrix(self, n=1):
+        '''
+        (counts, ngrams): a sparse responses x n-grams matrix of counts and the
+        list of n-grams (tuples of terms) its columns stand for. n-grams do not
+        run across the end of a response. Cached on the store.
+        '''
+        if n not in self._ngrams:
+            saved = _load_ngram_matrix(self.path, n) if self.path is not None else None
+            self._ngrams[n] = saved if saved is not None else self._build_ngram_matrix(n)
+        return self._ngrams[n]
+
+    def save(self, path, ngram_sizes=(1, 2, 3)):
+        '''
+        write the store, and its n-gram count matrices for ngram_sizes, to the
+        folder path. The folder is written next to path and renamed into place.
+        '''
+        import numpy as np
+
+        tmp_path = path.rstrip(os.sep) + '.' + str(os.getpid()) + '.tmp'
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, 'ids.npy'), np.asarray(self.ids, dtype=np.int32))
+        np.save(os.path.join(tmp_path, 'offsets.npy'), np.asarray(self.offsets, dtype=np.int64))
+        np.save(os.path.join(tmp_path, 'vocab.npy'), np.asarray(self.vocab, dtype=str))
+        np.save(os.path.join(tmp_path, 'doc_index.npy'), np.asarray(self.doc_index), allow_pickle=True)
+        for n in ngram_sizes:
+            counts, _ = self.ngram_matrix(n)
+            _, keys = self.ngram_keys(n)
+            np.save(os.path.join(tmp_path, 'counts%d_data.npy' % n), counts.data)
+            np.save(os.path.join(tmp_path, 'counts%d_indices.npy' % n), counts.indices)
+            np.save(os.path.join(tmp_path, 'counts%d_indptr.npy' % n), counts.indptr)
+            np.save(os.path.join(tmp_path, 'counts%d_keys.npy' % n), np.unique(keys))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'column': self.column, 'ngram_sizes': list(ngram_sizes)}, f)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # another process saved the same store first
+            import shutil
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return path
+
+    def ngram_keys(self, n):
+        '''
+        (docs, keys): every n-gram occurrence as the response it is in and one
+        integer encoding its token ids (base len(vocab)), in text order.
+        ValueError if len(vocab) ** n does not fit in an int64.
+        '''
+        import numpy as np
+
+        base = max(len(self.vocab), 1)
+        if base ** n >= 2 ** 63:
+            raise ValueError('%d-gram keys of a %d word vocabulary do not fit in 64 bits' % (n, base))
+        doc = self.doc_of_position()
+        if len(self.ids) < n:
+            starts = np.zeros(0, dtype=np.int64)
+        else:
+            starts = np.arange(len(self.ids) - n + 1)
+            # keep the windows that start and end in the same response
+            starts = starts[doc[starts] == doc[starts + n - 1]]
+
+        keys = np.zeros(len(starts), dtype=np.int64)
+        for i in range(n):
+            keys = keys * base + self.ids[starts + i]
+        return doc[starts], keys
+
+    def _build_ngram_matrix(self, n):
+        import numpy as np
+        from scipy import sparse
+
+        docs, keys = self.ngram_keys(n)
+        unique_keys, cols = np.unique(keys, return_inverse=True)
+
+        counts = sparse.csr_matrix((np.ones(len(keys), dtype=np.int64), (docs, cols)),
+                                   shape=(len(self), len(unique_keys)))
+        counts.sum_duplicates()
+        return counts, self.decode(unique_keys, n)
+
+    def decode(self, keys, n):
+        '''n-grams (or terms for n=1) from their integer keys'''
+        import numpy as np
+
+        base = max(len(self.vocab), 1)
+        parts = []
+        for _ in range(n):
+            parts.append(keys % base)
+            keys = keys // base
+        parts = parts[::-1]
+        vocab = np.asarray(self.vocab, dtype=object)
+        if n == 1:
+            return list(vocab[parts[0]])
+        return list(zip(*[vocab[p] for p in parts]))
+
+
+@lru_cache(maxsize=None)
+def open_store(path):
+    '''a saved store with its arrays memory mapped read only, once per process'''
+    import numpy as np
+
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    store = TokenStore(np.load(os.path.join(path, 'ids.npy'), mmap_mode='r'),
+                       np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r'),
+                       np.load(os.path.join(path, 'vocab.npy')).tolist(),
+                       np.load(os.path.join(path, 'doc_index.npy'), allow_pickle=True), meta['column'])
+    store.path = path
+    return store
+
+
+def _load_ngram_matrix(path, n):
+    '''the saved (counts, ngrams) of a store, or None if n-grams of size n were not saved'''
+    import numpy as np
+    from scipy import sparse
+
+    prefix = os.path.join(path, 'counts%d_' % n)
+    if not os.path.exists(prefix + 'keys.npy'):
+        return None
+    store = open_store(path)
+    keys = np.load(prefix + 'keys.npy', mmap_mode='r')
+    counts = sparse.csr_matrix((np.load(prefix + 'data.npy', mmap_mode='r'),
+                                np.load(prefix + 'indices.npy', mmap_mode='r'),
+                                np.load(prefix + 'indptr.npy', mmap_mode='r')),
+                               shape=(len(store), len(keys)), copy=False)
+    return counts, store.decode(np.asarray(keys), n)
+
+
+def cached_store(df, column_name, cache_dir='.iprt_cache/tokens', config=None, ngram_sizes=(1, 2, 3)):
+    '''
+    the store of a column, tokenized once per (column contents, config) and
+    opened from cache_dir after that. config is how the text is normalised,
+    by default text.normalisation_config() (so a store tokenized with
+    autocorrect is not reused after text.set_spell_checker).
+    '''
+    from iprt import cache, text
+
+    if config is None:
+        config = text.normalisation_config()
+    key = cache.combine(cache.hash_frame(df[[column_name]]),
+                        cache.hash_params({'column': column_name, 'config': config}))
+    path = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        os.makedirs(cache_dir, exist_ok=True)
+        TokenStore.from_frame(df, column_name).save(path, ngram_sizes)
+    return open_store(path)
@@ -0,0 +1,110 @@
+'''
+Topics in the free text, alongside the common_words and bigrams_phrases
+tables.
+
+The responses x words count matrix comes straight from the token store (no
+second tokenizer) and the model is fitted in minibatches with partial_fit,
+so only one batch of rows is worked on at a time:
+- 'lda': online LatentDirichletAllocation on the raw counts
+- 'nmf': MiniBatchNMF (scikit-learn >= 1.1) on tf-idf weighted counts
+
+    model = fit_topics(df, 'thoughts_facs', n_topics=8)
+    top_terms(model, 10)
+    topic_prevalence(model, df, 'Age')
+
+topics_stage runs these as the cached topics stage of
+pipeline.analysis_pipeline (iprt pipeline --topics 8).
+'''
+
+
+class TopicModel(object):
+    def __init__(self, estimator, store, vocab_cols, terms, doc_topics, method):
+        self.estimator = estimator
+        self.store = store
+        self.vocab_cols = vocab_cols  # columns of the store's word matrix that were kept
+        self.terms = terms
+        self.doc_topics = doc_topics  # responses x topics, rows sum to 1
+        self.method = method
+
+
+def _batches(n_rows, batch_size, rng):
+    order = rng.permutation(n_rows)
+    for start in range(0, n_rows, batch_size):
+        yield order[start:start + batch_size]
+
+
+def document_term_matrix(store, min_df=2, max_df=0.5):
+    '''
+    (counts, kept columns, terms): the sparse responses x words matrix,
+    keeping words used in at least min_df responses and at most max_df of them
+    '''
+    import numpy as np
+
+    counts, words = store.ngram_matrix(1)
+    doc_freq = np.asarray((counts > 0).sum(axis=0)).ravel()
+    keep = np.flatnonzero((doc_freq >= min_df) & (doc_freq <= max_df * max(counts.shape[0], 1)))
+    return counts[:, keep].tocsr(), keep, [words[i] for i in keep]
+
+
+def fit_topics(df, column_name, n_topics=8, method='lda', batch_size=256, n_epochs=5, min_df=2,
+               max_df=0.5, seed=0, store=None):
+    import numpy as np
+    from iprt.tokens import TokenStore
+
+    if store is None:
+        store = TokenStore.from_frame(df, column_name)
+    counts, keep, terms = document_term_matrix(store, min_df=min_df, max_df=max_df)
+    rng = np.random.RandomState(seed)
+
+    if method == 'lda':
+        from sklearn.decomposition import LatentDirichletAllocation
+        estimator = LatentDirichletAllocation(n_components=n_topics, learning_method='online',
+                                              batch_size=batch_size, total_samples=counts.shape[0],
+                                              random_state=seed)
+        features = counts
+    elif method == 'nmf':
+        from sklearn.decomposition import MiniBatchNMF
+        from sklearn.feature_extraction.text import TfidfTransformer
+        features = TfidfTransformer().fit_transform(counts)
+        estimator = MiniBatchNMF(n_components=n_topics, batch_size=batch_size, init='nndsvda',
+                                 random_state=seed)
+    else:
+        raise ValueError('method must be lda or nmf, not ' + str(method))
+
+    for _ in range(n_epochs):
+        for rows in _batches(features.shape[0], batch_size, rng):
+            estimator.partial_fit(features[rows])
+
+    doc_topics = np.vstack([estimator.transform(features[start:start + batch_size])
+                            for start in range(0, features.shape[0], batch_size)])
+    totals = doc_topics.sum(axis=1, keepdims=True)
+    doc_topics = np.divide(doc_topics, totals, out=np.zeros_like(doc_topics), where=totals > 0)
+    return TopicModel(estimator, store, keep, terms, doc_topics, method)
+
+
+def top_terms(model, k=10):
+    '''DataFrame with a column per topic of its k highest weighted terms'''
+    import numpy as np
+    import pandas as pd
+
+    components = model.estimator.components_
+    best = np.argsort(-components, axis=1)[:, :k]
+    return pd.DataFrame(dict(('topic_' + str(t), pd.Series([model.terms[i] for i in best[t]]))
+                             for t in range(components.shape[0])))
+
+
+def topic_prevalence(model, df, group_col):
+    '''mean topic share of the responses in each group, groups x topics'''
+    import pandas as pd
+
+    groups = df.loc[model.store.doc_index, group_col].values
+    shares = pd.DataFrame(model.doc_topics, columns=['topic_' + str(t) for t in range(model.doc_topics.shape[1])])
+    shares[group_col] = groups
+    return shares.groupby(group_col).mean()
+
+
+def topics_stage(df, column='thoughts_facs', group_cols=(), n_topics=8, method='lda', k=10, seed=0):
+    '''{'top_terms': DataFrame, 'topic_prevalence': {grouping column: DataFrame}}'''
+    model = fit_topics(df, column, n_topics=n_topics, method=method, seed=seed)
+    return {'top_terms': top_terms(model, k),
+            'topic_prevalence': dict((col, topic_prevalence(model, df, col)) for col in group_cols)}
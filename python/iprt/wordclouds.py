@@ -0,0 +1,140 @@
+'''
+Word clouds drawn from word and bigram counts (make_wordcloud from
+Wordclouds.py).
+
+make_wordcloud joined the normalised words back into a string for
+WordCloud.generate, which split and counted them all over again. Here the
+counts are made once, from the per-response tokens, and passed straight to
+WordCloud.generate_from_frequencies. Every cloud (plain, masked, bigram and
+one per group) is described by a spec dict and the specs are drawn in a pool
+of worker processes with the Agg backend, each figure saved and closed, so
+nothing depends on plt.show() and nothing is saved blank. The mask image is
+prepared once per run (see iprt.masks) and shared by the workers.
+'''
+
+import os
+import re
+from collections import Counter
+
+from iprt import instrument
+
+# the titles used in the notebooks
+TITLES = {
+    'prison_service_facilities_other_thoughts': 'Other thoughts',
+    'improve_contact_family_other_suggestions': 'Suggestions to improve contact with family',
+    'Other_thoughts': 'Other thoughts',
+    'Suggestions_for_improvement': 'Suggestions to improve contact with family',
+}
+
+
+def word_frequencies(token_lists):
+    counts = Counter()
+    for tokens in token_lists:
+        counts.update(tokens)
+    return counts
+
+
+def bigram_frequencies(token_lists):
+    '''counts of successive words joined with an _ => fat cat -> fat_cat'''
+    counts = Counter()
+    for tokens in token_lists:
+        counts.update(a + '_' + b for a, b in zip(tokens, tokens[1:]))
+    return counts
+
+
+def count_stage(df, columns, group_cols):
+    '''
+    word and bigram counts for each free text column, overall and for every
+    group. Keyed by (column, group_col, group), with None for the overall counts
+    '''
+    from iprt import text
+
+    counts = {}
+    for column in columns:
+        tokens = text.response_tokens(df, column)
+        counts[(column, None, None)] = {'words': word_frequencies(tokens),
+                                        'bigrams': bigram_frequencies(tokens)}
+        for col in group_cols:
+            for idx, grp in tokens.groupby(df.loc[tokens.index, col]):
+                counts[(column, col, idx)] = {'words': word_frequencies(grp),
+                                              'bigrams': bigram_frequencies(grp)}
+    return counts
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(value)).strip('_')
+
+
+def cloud_specs(counts, output_dir, titles=None, mask_file=None, bigrams=True, groups=True):
+    '''
+    one spec per cloud to draw: plain, masked and bigram clouds of each column,
+    and a plain cloud for each group. mask_file is a mask from
+    masks.prepare_mask
+    '''
+    titles = titles or TITLES
+    specs = []
+    for (column, col, idx), freqs in sorted(counts.items(), key=lambda kv: tuple(map(str, kv[0]))):
+        title = titles.get(column, column)
+        name = _slug(column)
+        if col is not None:
+            if groups:
+                specs.append({'frequencies': freqs['words'], 'title': title + ' (' + str(col) + ': ' + str(idx) + ')',
+                              'output_name': os.path.join(output_dir, name + '_' + _slug(col) + '_' + _slug(idx) + '.png')})
+            continue
+        specs.append({'frequencies': freqs['words'], 'title': title,
+                      'output_name': os.path.join(output_dir, name + '_no_mask.png')})
+        if mask_file is not None:
+            specs.append({'frequencies': freqs['words'], 'title': title, 'mask_file': mask_file,
+                          'output_name': os.path.join(output_dir, name + '_mask.png')})
+        if bigrams:
+            specs.append({'frequencies': freqs['bigrams'], 'title': title + ' (bigrams)',
+                          'output_name': os.path.join(output_dir, name + '_bigram.png')})
+    return specs
+
+
+def render(spec):
+    '''draw and save one cloud, returns the file name (or None if there are no words)'''
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    from wordcloud import WordCloud
+    from iprt import masks
+
+    if not spec['frequencies']:
+        return None
+    if spec.get('mask_file'):
+        mask = masks.open_mask(spec['mask_file'])
+        wordcloud = WordCloud(background_color='white', max_words=200, min_font_size=10, max_font_size=40, mask=mask)
+    else:
+        wordcloud = WordCloud(background_color='white', max_words=100, min_font_size=10, max_font_size=40)
+    wordcloud.generate_from_frequencies(dict(spec['frequencies']))
+
+    fig = plt.figure()
+    plt.imshow(wordcloud)
+    plt.axis('off')
+    plt.title(spec['title'])
+    fig.savefig(spec['output_name'], dpi=spec.get('dpi', 300))
+    plt.close(fig)
+    return spec['output_name']
+
+
+@instrument.instrumented('render', count=len)
+def render_all(specs, processes=None):
+    '''draw every spec, in parallel unless processes=1'''
+    for spec in specs:
+        os.makedirs(os.path.dirname(spec['output_name']) or '.', exist_ok=True)
+    if processes == 1:
+        return [render(spec) for spec in specs]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(render, specs))
+
+
+def wordcloud_stage(counts, output_dir, titles=None, mask_path=None, mask_hash=None, mask_size=None,
+                    mask_cache_dir='.iprt_cache/masks', processes=None):
+    mask_file = None
+    if mask_path is not None:
+        from iprt import masks
+        mask_file = masks.prepare_mask(mask_path, cache_dir=mask_cache_dir, size=mask_size)
+    specs = cloud_specs(counts, output_dir, titles=titles, mask_file=mask_file)
+    return [fn for fn in render_all(specs, processes=processes) if fn is not None]
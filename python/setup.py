@@ -0,0 +1,26 @@
+from setuptools import setup
+
+setup(
+    name='iprt',
+    version='0.1.0',
+    description='Survey analysis for the Irish Penal Reform Trust DataKind project',
+    packages=['iprt'],
+    python_requires='>=3.6',
+    install_requires=[
+        'numpy',
+        'pandas',
+        'scipy',
+        'nltk',
+        'autocorrect<1.0',  # spell(); 1.0 replaced it with Speller
+        'scikits.bootstrap',
+    ],
+    extras_require={
+        'plots': ['matplotlib', 'seaborn', 'wordcloud', 'Pillow'],
+        'topics': ['scikit-learn>=1.1'],
+        'dask': ['dask[distributed]'],
+        'parquet': ['pyarrow'],
+    },
+    entry_points={
+        'console_scripts': ['iprt=iprt.cli:main'],
+    },
+)